@@ -0,0 +1,422 @@
+"""
+Load-test every API endpoint in-process against a seeded throwaway database.
+
+A test database is created next to the configured one (the usual DB_* settings) and filled by
+transactions.generator with --ngos NGOs and --transactions ledger rows. Every endpoint in ngos/urls.py,
+transactions/urls.py and users/urls.py then gets --requests scripted requests through DRF's
+APIClient, with real token authentication. Ganache and Razorpay are replaced by the in-process
+fakes in benchmarks.fakes, so the numbers are this code's own cost. Latency percentiles,
+throughput and queries per request are printed and saved as JSON. Pass an earlier result as
+--baseline to see what changed between commits.
+
+    python -m benchmarks.api_load --ngos 50 --transactions 1000000 --keepdb --output before.json
+    python -m benchmarks.api_load --ngos 50 --transactions 1000000 --keepdb --baseline before.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import django
+
+# One scripted request; raw bodies are posted as-is with the given extra headers
+Request = namedtuple("Request", ["method", "path", "data", "token", "headers", "raw"], defaults=(None, None, {}, False))
+
+PASSWORD = "benchmark-password"
+LOGIN_USERNAME = "bench_login"
+# Donors that get a token and send the authenticated requests
+TOKEN_DONORS = 1000
+# Words found in the generated expense descriptions
+SEARCH_TERMS = ("supplies", "transport", "salaries", "venue")
+# Expenses in each batch_expenses request
+BATCH_EXPENSES = 50
+URLCONFS = ("ngos.urls", "transactions.urls", "users.urls")
+
+
+class Context:
+    """Seeded ids and tokens the scenarios pick from."""
+
+    def __init__(self, rng):
+        from django.db.models import Max, Min
+        from rest_framework.authtoken.models import Token
+
+        from ngos.models import NGO
+        from transactions.models import Transaction
+        from transactions.payments import get_gateway
+
+        self.rng = rng
+        self.counter = itertools.count()
+        self.gateway = get_gateway()
+        self.ngo_ids = list(NGO.objects.order_by("id").values_list("id", flat=True))
+        # (token, NGO id) for each NGO admin, and donor (token, user id) pairs
+        self.admins = list(
+            NGO.objects.filter(admin__auth_token__isnull=False)
+            .order_by("id")
+            .values_list("admin__auth_token__key", "id")
+        )
+        self.donors = list(
+            Token.objects.filter(user__username__startswith="bench_donor_").values_list("key", "user_id")
+        )
+        span = Transaction.objects.aggregate(first=Min("id"), last=Max("id"))
+        self.transaction_ids = (span["first"] or 0, span["last"] or 0)
+
+    def ngo(self):
+        return self.rng.choice(self.ngo_ids)
+
+    def donor(self):
+        return self.rng.choice(self.donors)
+
+    def admin(self):
+        return self.rng.choice(self.admins)
+
+    def unique(self, prefix):
+        return f"{prefix}_{os.getpid()}_{next(self.counter)}"
+
+
+def _reverse(name, *args):
+    from django.urls import reverse
+
+    return reverse(name, args=args)
+
+
+def verify_payment_request(ctx):
+    # The order and the Checkout payment are made before the clock starts
+    token, user_id = ctx.donor()
+    order = ctx.gateway.create_order("250", ctx.ngo(), user_id)
+    return Request("post", _reverse("verify_payment"), ctx.gateway.complete_payment(order), token)
+
+
+def webhook_request(ctx):
+    from transactions.webhooks import webhook_signature
+
+    _, user_id = ctx.donor()
+    payment_id = ctx.unique("pay_bench")
+    entity = {
+        "id": payment_id,
+        "order_id": ctx.unique("order_bench"),
+        "amount": 25000,
+        "status": "captured",
+        "notes": {"ngo_id": ctx.ngo(), "user_id": user_id},
+    }
+    body = json.dumps({"event": "payment.captured", "payload": {"payment": {"entity": entity}}}).encode()
+    headers = {"HTTP_X_RAZORPAY_SIGNATURE": webhook_signature(body), "HTTP_X_RAZORPAY_EVENT_ID": f"evt_{payment_id}"}
+    return Request("post", _reverse("razorpay_webhook"), body, None, headers, True)
+
+
+def transaction_detail_request(ctx):
+    first, last = ctx.transaction_ids
+    return Request("get", _reverse("transaction_detail", ctx.rng.randint(first, last)), token=ctx.donor()[0])
+
+
+def expense_request(ctx):
+    token, ngo_id = ctx.admin()
+    data = {"amount": "1200.50", "proof_url": "https://example.com/proof.pdf", "description": "Benchmark expense"}
+    return Request("post", _reverse("outgoing_transactions", ngo_id), data, token)
+
+
+def batch_expenses_request(ctx):
+    token, ngo_id = ctx.admin()
+    data = [
+        {"amount": "310.00", "proof_url": f"https://example.com/receipts/{i}.pdf", "description": "Benchmark receipt"}
+        for i in range(BATCH_EXPENSES)
+    ]
+    return Request("post", _reverse("batch_expenses", ngo_id), data, token)
+
+
+def ngo_update_request(ctx):
+    token, ngo_id = ctx.admin()
+    return Request("put", _reverse("ngo_update", ngo_id), {"description": ctx.unique("Updated")}, token)
+
+
+# (URL name, method) -> function building the next request from the Context
+SCENARIOS = {
+    ("list_ngos", "get"): lambda ctx: Request("get", _reverse("list_ngos")),
+    ("ngo_detail", "get"): lambda ctx: Request("get", _reverse("ngo_detail", ctx.ngo()), token=ctx.donor()[0]),
+    ("ngo_summary", "get"): lambda ctx: Request("get", _reverse("ngo_summary", ctx.ngo()), token=ctx.donor()[0]),
+    ("ngo_timeseries", "get"): lambda ctx: Request(
+        "get", _reverse("ngo_timeseries", ctx.ngo()) + "?bucket=day", token=ctx.donor()[0]
+    ),
+    ("donate_to_ngo", "post"): lambda ctx: Request(
+        "post", _reverse("donate_to_ngo", ctx.ngo()), {"amount": "500"}, ctx.donor()[0]
+    ),
+    ("outgoing_transactions", "get"): lambda ctx: Request(
+        "get", _reverse("outgoing_transactions", ctx.ngo()), token=ctx.donor()[0]
+    ),
+    ("outgoing_transactions", "post"): expense_request,
+    ("batch_expenses", "post"): batch_expenses_request,
+    ("incoming_transactions", "get"): lambda ctx: Request(
+        "get", _reverse("incoming_transactions", ctx.ngo()), token=ctx.donor()[0]
+    ),
+    ("ngo_admin", "get"): lambda ctx: Request("get", _reverse("ngo_admin"), token=ctx.admin()[0]),
+    ("ngo_update", "put"): ngo_update_request,
+    ("search_ngos", "get"): lambda ctx: Request("get", _reverse("search_ngos") + "?q=generated"),
+    ("search_transactions", "get"): lambda ctx: Request(
+        "get", _reverse("search_transactions") + f"?q={ctx.rng.choice(SEARCH_TERMS)}", token=ctx.donor()[0]
+    ),
+    ("transaction_detail", "get"): transaction_detail_request,
+    ("create_order", "post"): lambda ctx: Request(
+        "post", _reverse("create_order", ctx.ngo()), {"amount": "250"}, ctx.donor()[0]
+    ),
+    ("verify_payment", "post"): verify_payment_request,
+    ("razorpay_webhook", "post"): webhook_request,
+    ("transaction_list", "get"): lambda ctx: Request("get", _reverse("transaction_list"), token=ctx.donor()[0]),
+    ("transaction_export", "get"): lambda ctx: Request(
+        "get", _reverse("transaction_export") + f"?ngo_id={ctx.ngo()}&output=csv", token=ctx.donor()[0]
+    ),
+    ("register", "post"): lambda ctx: Request(
+        "post", _reverse("register"), {"username": ctx.unique("bench_new"), "password": PASSWORD}
+    ),
+    ("login", "post"): lambda ctx: Request(
+        "post", _reverse("login"), {"username": LOGIN_USERNAME, "password": PASSWORD}
+    ),
+}
+
+
+def check_coverage():
+    """Fail loudly when an endpoint is added to the URL configs without a scenario here."""
+    from django.urls import get_resolver
+
+    names = {pattern.name for urlconf in URLCONFS for pattern in get_resolver(urlconf).url_patterns}
+    missing = names - {name for name, _ in SCENARIOS}
+    if missing:
+        raise SystemExit(f"No benchmark scenario for: {', '.join(sorted(missing))}")
+
+
+def seed(ngo_count, transaction_count, donor_count, batch_size, seed_value):
+    """Generate the benchmark ledger offline and give the accounts the scenarios use a token."""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+
+    from transactions.generator import generate_ledger
+
+    def report(inserted, elapsed):
+        print(f"Seeded {inserted}/{transaction_count} transactions ({elapsed:.1f}s)", flush=True)
+
+    generate_ledger(
+        users=donor_count,
+        ngos=ngo_count,
+        transactions=transaction_count,
+        prefix="bench",
+        batch_size=batch_size,
+        deferred_hash=True,
+        password=PASSWORD,
+        seed=seed_value,
+        report=report,
+    )
+    User.objects.create(username=LOGIN_USERNAME, password=make_password(PASSWORD))
+    users = list(User.objects.filter(username__startswith="bench_admin_"))
+    users += User.objects.filter(username__startswith="bench_donor_").order_by("id")[:TOKEN_DONORS]
+    Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+
+
+def send(client, request):
+    if request.token:
+        client.credentials(HTTP_AUTHORIZATION=f"Token {request.token}")
+    else:
+        client.credentials()
+    call = getattr(client, request.method)
+    if request.raw:
+        response = call(request.path, request.data, content_type="application/json", **request.headers)
+    else:
+        response = call(request.path, request.data, format="json", **request.headers)
+    # Streaming responses only do their work while being read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def run_endpoint(build, ctx, requests, concurrency, warmup):
+    """Send requests built by build(ctx) from concurrency threads; returns the endpoint's figures."""
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    latencies = []
+    query_counts = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(count, record):
+        client = APIClient()
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with connection.execute_wrapper(count_queries):
+                for _ in range(count):
+                    request = build(ctx)
+                    queries = 0
+                    started = time.perf_counter()
+                    response = send(client, request)
+                    elapsed = time.perf_counter() - started
+                    if record:
+                        with lock:
+                            latencies.append(elapsed)
+                            query_counts.append(queries)
+                            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    worker(warmup, record=False)
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests, record=True)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda count: worker(count, True), shares))
+    wall = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for code, count in statuses.items() if code >= 400),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": len(latencies) / wall if wall else 0,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0,
+        "p50_ms": percentiles[49] * 1000 if latencies else 0,
+        "p95_ms": percentiles[94] * 1000 if latencies else 0,
+        "p99_ms": percentiles[98] * 1000 if latencies else 0,
+        "queries_mean": statistics.fmean(query_counts) if query_counts else 0,
+        "queries_max": max(query_counts, default=0),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def with_change(value, old, digits):
+    text = f"{value:.{digits}f}"
+    if old:
+        text += f" ({(value - old) / old * 100:+.0f}%)"
+    return text
+
+
+def print_results(results, baseline):
+    old_endpoints = (baseline or {}).get("endpoints", {})
+    print(f"\n{'endpoint':<34}{'req/s':>16}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'queries':>16}{'errors':>8}")
+    for name, result in results.items():
+        old = old_endpoints.get(name, {})
+        queries = f"{result['queries_mean']:.1f}"
+        if old and round(old["queries_mean"], 1) != round(result["queries_mean"], 1):
+            queries += f" (was {old['queries_mean']:.1f})"
+        print(
+            f"{name:<34}"
+            f"{with_change(result['throughput_rps'], old.get('throughput_rps'), 1):>16}"
+            f"{with_change(result['p50_ms'], old.get('p50_ms'), 2):>16}"
+            f"{with_change(result['p95_ms'], old.get('p95_ms'), 2):>16}"
+            f"{with_change(result['p99_ms'], old.get('p99_ms'), 2):>16}"
+            f"{queries:>16}{result['errors']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ngos", type=int, default=20, help="NGOs to seed")
+    parser.add_argument("--transactions", type=int, default=10000, help="Ledger rows to seed")
+    parser.add_argument("--donors", type=int, default=1000, help="Donor accounts to seed")
+    parser.add_argument("--seed-batch-size", type=int, default=10000, help="Rows per bulk insert while seeding")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads sending requests at once")
+    parser.add_argument("--anchor-mode", choices=["direct", "batch"], help="Override BLOCKCHAIN_ANCHOR_MODE")
+    parser.add_argument("--only", nargs="*", help="Only run endpoints whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the data set and the request mix")
+    parser.add_argument("--keepdb", action="store_true", help="Keep the seeded test database for the next run")
+    parser.add_argument("--output", default="api_load.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ngo_backend.settings")
+    # A log line per request would measure the terminal; the timing itself stays on
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    django.setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from ngos.models import NGO
+    from transactions.models import Transaction
+    from .fakes import fake_upstreams
+
+    check_coverage()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    rng = random.Random(args.seed)
+    setup_test_environment()
+    database = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb, serialize=False)
+    try:
+        if NGO.objects.exists():
+            print(f"Reusing {NGO.objects.count()} NGOs and {Transaction.objects.count()} transactions")
+        else:
+            seed(args.ngos, args.transactions, args.donors, args.seed_batch_size, args.seed)
+
+        anchor_mode = args.anchor_mode or settings.BLOCKCHAIN_ANCHOR_MODE
+        results = {}
+        with fake_upstreams(), override_settings(BLOCKCHAIN_ANCHOR_MODE=anchor_mode):
+            cache.clear()
+            ctx = Context(rng)
+            for (url_name, method), build in SCENARIOS.items():
+                name = f"{method.upper()} {url_name}"
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                print(f"Running {name}", flush=True)
+                results[name] = run_endpoint(build, ctx, args.requests, args.concurrency, args.warmup)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.now(dt_timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "ngos": NGO.objects.count(),
+                "transactions": Transaction.objects.count(),
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "anchor_mode": anchor_mode,
+                "async_views": settings.ASYNC_VIEWS,
+                "seed": args.seed,
+            },
+            "endpoints": results,
+        }
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0, keepdb=args.keepdb)
+        teardown_test_environment()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_results(results, baseline)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
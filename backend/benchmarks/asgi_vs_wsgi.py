@@ -0,0 +1,184 @@
+"""
+Compare the sync views under WSGI (gunicorn) with the async views under ASGI (uvicorn).
+
+Both servers run the same code with the same number of worker processes against
+benchmarks.stub_upstream. The difference in throughput is therefore what blocking on Razorpay
+and the RPC node costs. It needs the packages in benchmarks/requirements.txt. Like api_load,
+it runs against a throwaway test database created next to the configured one (the usual DB_*
+settings) and dropped afterwards, so the donation rows it writes and the nonces it allocates never
+touch the real ledger or the ChainNonce row live chain workers use.
+
+    python -m benchmarks.asgi_vs_wsgi --workers 2 --threads 8 --concurrency 64 --duration 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import aiohttp
+import django
+
+# Endpoint name -> (URL name, request body); both spend most of their time waiting on an upstream
+ENDPOINTS = {
+    "create order (Razorpay)": ("create_order", {"amount": "100"}),
+    "donate (chain write)": ("donate_to_ngo", {"amount": "100"}),
+}
+
+
+def create_fixtures():
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+
+    from ngos.models import NGO
+
+    user = User.objects.create_user(username=f"benchmark_{uuid.uuid4().hex[:12]}")
+    token = Token.objects.create(user=user)
+    ngo = NGO.objects.create(
+        name="Benchmark NGO",
+        logo_url="https://example.com/logo.png",
+        certificate_url="https://example.com/cert",
+        admin=user,
+    )
+    return user, token, ngo
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            # Any HTTP answer (a 401 here) means the server is up
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+async def run_load(url, token, body, concurrency, duration):
+    """Keep concurrency requests in flight for duration seconds; returns throughput and latency figures."""
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers={"Authorization": f"Token {token}"}) as session:
+
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    async with session.post(url, json=body) as response:
+                        await response.read()
+                        ok = response.status < 400
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests_per_second": len(latencies) / duration,
+        "p50_ms": percentiles[49] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2, help="Server processes for both servers")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per gunicorn worker")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests kept in flight")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load per endpoint")
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream round trip in seconds")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--stub-port", type=int, default=8600)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ngo_backend.settings")
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.urls import reverse
+
+    setup_test_environment()
+    database = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    env = {
+        **os.environ,
+        "DEBUG": "False",
+        # The servers use the test database and a cache of their own, never the real ones
+        "DB_NAME": connection.settings_dict["NAME"],
+        "CACHE_BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BLOCKCHAIN_ANCHOR_MODE": "direct",
+        "BLOCKCHAIN_RPC_URLS": f"http://127.0.0.1:{args.stub_port}/rpc",
+        "RAZORPAY_BASE_URL": f"http://127.0.0.1:{args.stub_port}",
+        "RAZORPAY_KEY_ID": os.getenv("RAZORPAY_KEY_ID", "rzp_test_benchmark"),
+        "RAZORPAY_KEY_SECRET": os.getenv("RAZORPAY_KEY_SECRET", "benchmark_secret"),
+    }
+    bind = f"127.0.0.1:{args.port}"
+    servers = {
+        "WSGI gunicorn, sync views": (
+            ["gunicorn", "ngo_backend.wsgi:application", "--workers", str(args.workers)]
+            + ["--threads", str(args.threads), "--bind", bind],
+            "False",
+        ),
+        "ASGI uvicorn, async views": (
+            ["uvicorn", "ngo_backend.asgi:application", "--workers", str(args.workers), "--port", str(args.port)]
+            + ["--no-access-log", "--log-level", "warning"],
+            "True",
+        ),
+    }
+
+    results = {}
+    try:
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_upstream", "--port", str(args.stub_port)]
+            + ["--latency", str(args.latency)],
+            env=env,
+        )
+        try:
+            _, token, ngo = create_fixtures()
+            for server, (command, async_views) in servers.items():
+                process = subprocess.Popen([sys.executable, "-m", *command], env={**env, "ASYNC_VIEWS": async_views})
+                try:
+                    wait_until_ready(f"http://{bind}/api/ngos/")
+                    for endpoint, (url_name, body) in ENDPOINTS.items():
+                        url = f"http://{bind}" + reverse(url_name, args=[ngo.id])
+                        results[server, endpoint] = asyncio.run(
+                            run_load(url, token.key, body, args.concurrency, args.duration)
+                        )
+                finally:
+                    process.terminate()
+                    process.wait()
+        finally:
+            stub.terminate()
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+        teardown_test_environment()
+
+    print(f"\n{'server':<28}{'endpoint':<26}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for (server, endpoint), result in results.items():
+        print(
+            f"{server:<28}{endpoint:<26}{result['requests_per_second']:>10.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
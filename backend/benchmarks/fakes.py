@@ -0,0 +1,126 @@
+"""
+In-process stand-ins for the Ethereum node and Razorpay, so benchmarks measure this code and nothing else.
+
+FakeChain answers the JSON-RPC calls the ledger makes from memory and mines every sent
+transaction into its own block at once. fake_upstreams() points the web3 registries at it and
+switches PAYMENT_GATEWAY to FakeRazorpayGateway for the duration of a with block.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.test import override_settings
+from eth_utils import keccak
+from web3 import AsyncWeb3, Web3
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+
+import ngos.utils
+from ngos.utils import AsyncWeb3Registry, Web3Registry
+
+CHAIN_ID = "0x539"
+WEBHOOK_SECRET = "benchmark_webhook_secret"
+
+
+class FakeChain:
+    """An instantly mining chain that keeps the receipt of every transaction sent to it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.block_number = 0
+        self.receipts = {}
+
+    def send(self, raw_transaction):
+        tx_hash = "0x" + keccak(hexstr=raw_transaction).hex()
+        with self._lock:
+            self.block_number += 1
+            self.receipts[tx_hash] = {
+                "transactionHash": tx_hash,
+                "blockNumber": hex(self.block_number),
+                "gasUsed": hex(21000),
+                "status": "0x1",
+            }
+        return tx_hash
+
+    def result(self, method, params):
+        if method == "eth_sendRawTransaction":
+            return self.send(params[0])
+        if method == "eth_getTransactionCount":
+            return hex(len(self.receipts))
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_chainId":
+            return CHAIN_ID
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        return None
+
+    def response(self, request_id, method, params):
+        return {"jsonrpc": "2.0", "id": request_id, "result": self.result(method, params)}
+
+
+class FakeChainProvider(JSONBaseProvider):
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+
+    def make_request(self, method, params):
+        return self.chain.response(next(self.request_counter), method, params)
+
+    def make_batch_request(self, requests):
+        return [self.make_request(method, params) for method, params in requests]
+
+
+class AsyncFakeChainProvider(AsyncJSONBaseProvider):
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+
+    async def make_request(self, method, params):
+        return self.chain.response(next(self.request_counter), method, params)
+
+    async def make_batch_request(self, requests):
+        return [await self.make_request(method, params) for method, params in requests]
+
+
+class FakeWeb3Registry(Web3Registry):
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+
+    def client(self, endpoint):
+        with self._lock:
+            if endpoint not in self._clients:
+                self._clients[endpoint] = Web3(FakeChainProvider(self.chain))
+            return self._clients[endpoint]
+
+
+class AsyncFakeWeb3Registry(AsyncWeb3Registry):
+    def __init__(self, chain):
+        super().__init__()
+        self.chain = chain
+
+    def client(self, endpoint):
+        with self._lock:
+            if endpoint not in self._clients:
+                self._clients[endpoint] = AsyncWeb3(AsyncFakeChainProvider(self.chain))
+            return self._clients[endpoint]
+
+
+@contextmanager
+def fake_upstreams():
+    """Route chain writes to a FakeChain and payments to FakeRazorpayGateway; yields the chain."""
+    chain = FakeChain()
+    registries = ngos.utils.web3_registry, ngos.utils.async_web3_registry
+    ngos.utils.web3_registry = FakeWeb3Registry(chain)
+    ngos.utils.async_web3_registry = AsyncFakeWeb3Registry(chain)
+    try:
+        with override_settings(
+            PAYMENT_GATEWAY="fake",
+            RAZORPAY_KEY_ID="rzp_test_benchmark",
+            RAZORPAY_KEY_SECRET="benchmark_secret",
+            RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET,
+        ):
+            yield chain
+    finally:
+        ngos.utils.web3_registry, ngos.utils.async_web3_registry = registries
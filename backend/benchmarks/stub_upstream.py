@@ -0,0 +1,68 @@
+"""
+Stand-in for Razorpay and the Ethereum JSON-RPC node that answers after a fixed delay.
+
+The delay stands for the network round trip to the real services, which is what the sync
+views spend their worker threads waiting on. Run it with:
+
+    python -m benchmarks.stub_upstream --port 8600 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import itertools
+
+from aiohttp import web
+from eth_utils import keccak
+
+order_ids = itertools.count(1)
+
+
+def rpc_result(method, params):
+    if method == "eth_sendRawTransaction":
+        return "0x" + keccak(hexstr=params[0]).hex()
+    if method in ("eth_getTransactionCount", "eth_blockNumber"):
+        return "0x0"
+    if method == "eth_chainId":
+        return "0x539"
+    return None
+
+
+def create_app(latency):
+    async def rpc(request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        calls = body if isinstance(body, list) else [body]
+        responses = [
+            {"jsonrpc": "2.0", "id": call["id"], "result": rpc_result(call["method"], call.get("params", []))}
+            for call in calls
+        ]
+        return web.json_response(responses if isinstance(body, list) else responses[0])
+
+    async def create_order(request):
+        await asyncio.sleep(latency)
+        data = await request.json()
+        return web.json_response({"id": f"order_{next(order_ids)}", "entity": "order", "status": "created", **data})
+
+    async def fetch_payment(request):
+        await asyncio.sleep(latency)
+        return web.json_response(
+            {"id": request.match_info["payment_id"], "amount": 10000, "status": "captured", "notes": {}}
+        )
+
+    app = web.Application()
+    app.add_routes(
+        [
+            web.post("/rpc", rpc),
+            web.post("/v1/orders", create_order),
+            web.get("/v1/payments/{payment_id}", fetch_payment),
+        ]
+    )
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each response is delayed")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency), host="127.0.0.1", port=args.port, print=None)
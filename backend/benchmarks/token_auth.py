@@ -0,0 +1,84 @@
+"""
+Queries and latency of authenticated reads with and without the in-process token cache.
+
+Each endpoint is called with a real "Authorization: Token" header, first with the caches in
+users.cache turned off (every request looks the token up) and then with them on. Runs against
+a throwaway test database like benchmarks.api_load.
+
+    python -m benchmarks.token_auth --requests 500
+"""
+
+import argparse
+import os
+
+import django
+
+from .api_load import Request, run_endpoint
+
+ENDPOINTS = {
+    "GET list_ngos": lambda ngo: ("list_ngos", []),
+    "GET ngo_detail": lambda ngo: ("ngo_detail", [ngo.id]),
+    "GET ngo_admin": lambda ngo: ("ngo_admin", []),
+    "GET ngo_summary": lambda ngo: ("ngo_summary", [ngo.id]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads sending requests at once")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ngo_backend.settings")
+    os.environ.setdefault("REQUEST_LOG_LEVEL", "WARNING")
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+
+    from ngos.models import NGO
+    from users.cache import ngo_admin_cache, token_cache
+
+    setup_test_environment()
+    database = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    results = {}
+    try:
+        admin = User.objects.create_user(username="bench_admin")
+        token = Token.objects.create(user=admin)
+        ngo = NGO.objects.create(
+            name="Benchmark NGO",
+            logo_url="https://example.com/logo.png",
+            certificate_url="https://example.com/cert",
+            admin=admin,
+        )
+
+        ttl = token_cache.ttl
+        for mode, mode_ttl in (("uncached", 0), ("cached", ttl)):
+            for cache in (token_cache, ngo_admin_cache):
+                cache.clear()
+                cache.ttl = mode_ttl
+            for name, target in ENDPOINTS.items():
+                url_name, url_args = target(ngo)
+                request = Request("get", reverse(url_name, args=url_args), token=token.key)
+                results[name, mode] = run_endpoint(lambda ctx: request, None, args.requests, args.concurrency, 5)
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+        teardown_test_environment()
+
+    print(
+        f"\n{'endpoint':<22}{'queries uncached':>18}{'queries cached':>16}"
+        f"{'p50 ms uncached':>17}{'p50 ms cached':>15}"
+    )
+    for name in ENDPOINTS:
+        uncached, cached = results[name, "uncached"], results[name, "cached"]
+        print(
+            f"{name:<22}{uncached['queries_mean']:>18.1f}{cached['queries_mean']:>16.1f}"
+            f"{uncached['p50_ms']:>17.2f}{cached['p50_ms']:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Per-request performance figures: total time, DB queries, chain RPC calls and Razorpay calls.
+
+RequestMetricsMiddleware starts a RequestStats for every request. Code that waits on an
+upstream wraps the wait in timed("rpc") or timed("razorpay"), and every DB query is counted
+by an execute wrapper. When the response is ready the figures are sent out three ways: a
+Server-Timing header, one JSON log line on the "ngo_backend.requests" logger, and the
+Prometheus counters served by metrics_view at /metrics to allowed scrapers.
+"""
+
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger("ngo_backend.requests")
+
+# Upstreams that get their own Server-Timing entry and counters
+UPSTREAMS = ("db", "rpc", "razorpay")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """Calls made and seconds spent per upstream during one request."""
+
+    __slots__ = ("started", "calls", "seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = dict.fromkeys(UPSTREAMS, 0)
+        self.seconds = dict.fromkeys(UPSTREAMS, 0.0)
+
+    def add(self, upstream, seconds):
+        self.calls[upstream] += 1
+        self.seconds[upstream] += seconds
+
+
+@contextmanager
+def timed(upstream):
+    """Count the wrapped block as one call to upstream in the current request's figures."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(upstream, time.perf_counter() - started)
+
+
+def count_query(execute, sql, params, many, context):
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+# Every thread's connection, including the ones async views use through sync_to_async
+connection_created.connect(instrument_connection)
+
+
+class MetricsRegistry:
+    """Counters and histograms of this process in the Prometheus text format, without a client library."""
+
+    HELP = {
+        "http_requests_total": ("counter", "Requests handled, by route, method and status"),
+        "http_request_duration_seconds": ("histogram", "Time from request to response, by route and method"),
+        "db_queries_total": ("counter", "DB queries run while handling requests, by route"),
+        "db_seconds_total": ("counter", "Seconds spent in DB queries, by route"),
+        "rpc_calls_total": ("counter", "Chain JSON-RPC round trips, by route"),
+        "rpc_seconds_total": ("counter", "Seconds spent waiting on the chain node, by route"),
+        "razorpay_calls_total": ("counter", "Razorpay API calls, by route"),
+        "razorpay_seconds_total": ("counter", "Seconds spent waiting on Razorpay, by route"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self._histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.setdefault((name, labels), [0] * (len(DURATION_BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def record(self, stats, route, method, status):
+        duration = time.perf_counter() - stats.started
+        self.inc("http_requests_total", (("route", route), ("method", method), ("status", str(status))))
+        self.observe("http_request_duration_seconds", (("route", route), ("method", method)), duration)
+        for upstream in UPSTREAMS:
+            if stats.calls[upstream]:
+                unit = "queries" if upstream == "db" else "calls"
+                self.inc(f"{upstream}_{unit}_total", (("route", route),), stats.calls[upstream])
+                self.inc(f"{upstream}_seconds_total", (("route", route),), stats.seconds[upstream])
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in self.HELP.items():
+            lines += [f"# HELP ngo_{name} {help_text}", f"# TYPE ngo_{name} {kind}"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"ngo_{name}{_labels(labels)} {value:g}")
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(DURATION_BUCKETS + ("+Inf",), values):
+                    lines.append(f"ngo_{name}_bucket{_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"ngo_{name}_sum{_labels(labels)} {values[-1]:g}")
+                lines.append(f"ngo_{name}_count{_labels(labels)} {values[-2]}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    escaped = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(stats):
+    total = (time.perf_counter() - stats.started) * 1000
+    entries = [f"app;dur={total:.1f}"]
+    for upstream in UPSTREAMS:
+        if stats.calls[upstream]:
+            unit = "queries" if upstream == "db" else "calls"
+            entries.append(
+                f'{upstream};dur={stats.seconds[upstream] * 1000:.1f};desc="{stats.calls[upstream]} {unit}"'
+            )
+    return ", ".join(entries)
+
+
+class RequestMetricsMiddleware:
+    """Collect RequestStats for each request and publish them; works for sync and async stacks."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def start(self):
+        instrument_connection(connection)
+        stats = RequestStats()
+        return stats, _current.set(stats)
+
+    def finish(self, request, response, stats):
+        # The route pattern, not the path, keeps ids out of the metric labels
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "unmatched"
+        registry.record(stats, route, request.method, response.status_code)
+        response["Server-Timing"] = server_timing(stats)
+
+        if logger.isEnabledFor(logging.INFO):
+            fields = {
+                "method": request.method,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - stats.started) * 1000, 2),
+            }
+            for upstream in UPSTREAMS:
+                fields[f"{upstream}_calls"] = stats.calls[upstream]
+                fields[f"{upstream}_ms"] = round(stats.seconds[upstream] * 1000, 2)
+            logger.info(json.dumps(fields))
+        return response
+
+
+def metrics_allowed(request):
+    """Scrapers are let in by the METRICS_TOKEN bearer token, or by address when they run in METRICS_ALLOWED_IPS."""
+    if settings.METRICS_TOKEN:
+        scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+        if scheme == "Bearer" and hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+            return True
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
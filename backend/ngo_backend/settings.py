@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the whole stack
+    "ngo_backend.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -98,6 +100,23 @@ DATABASES = {
 }
 
 
+# Local memory by default so no cache server is needed; it suits a single process. Cached NGO
+# responses are invalidated by whichever process changes the data (web workers, chain_worker,
+# anchor_worker, ...), so with several processes set CACHE_BACKEND to
+# django.core.cache.backends.filebased.FileBasedCache and CACHE_LOCATION to a directory they all
+# share. Redis (django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://host:port/db,
+# needs the redis package) or Memcached work as well when processes run on several hosts.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "ngo-backend"),
+    }
+}
+
+# Seconds a cached public NGO response is served before it is rebuilt; 0 builds every response afresh
+NGO_RESPONSE_CACHE_TIMEOUT = int(os.getenv("NGO_RESPONSE_CACHE_TIMEOUT", "300"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -172,6 +191,13 @@ CORS_ALLOW_METHODS = [
     "PUT",
 ]
 
+# Pagination headers on the transaction feeds
+CORS_EXPOSE_HEADERS = [
+    "link",
+    "x-next-cursor",
+    "server-timing",
+]
+
 CORS_ALLOW_HEADERS = [
     "accept",
     "accept-encoding",
@@ -186,10 +212,82 @@ CORS_ALLOW_HEADERS = [
 
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+RAZORPAY_BASE_URL = os.getenv("RAZORPAY_BASE_URL", "https://api.razorpay.com")
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT", "3"))
+RAZORPAY_TIMEOUT = float(os.getenv("RAZORPAY_TIMEOUT", "10"))
+RAZORPAY_POOL_SIZE = int(os.getenv("RAZORPAY_POOL_SIZE", "20"))
+# Connection failures are retried for every call; read errors and 5xx only for lookups
+RAZORPAY_RETRIES = int(os.getenv("RAZORPAY_RETRIES", "2"))
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+# "razorpay", or "fake" for a local stand-in that needs no network (tests, benchmarks, offline work)
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "razorpay")
+
+# Serve the payment and chain-write endpoints with their async views. Enable it when running
+# under an ASGI server (uvicorn); under WSGI every async request gets its own event loop.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# Blockchain RPC endpoints, tried in order with failover
+BLOCKCHAIN_RPC_URLS = [
+    url.strip() for url in os.getenv("BLOCKCHAIN_RPC_URLS", "http://ganache:8545").split(",") if url.strip()
+]
+BLOCKCHAIN_RPC_TIMEOUT = float(os.getenv("BLOCKCHAIN_RPC_TIMEOUT", "10"))
+BLOCKCHAIN_RPC_POOL_SIZE = int(os.getenv("BLOCKCHAIN_RPC_POOL_SIZE", "20"))
+# Seconds an endpoint that failed to connect is skipped before it is tried again
+BLOCKCHAIN_RPC_RETRY_AFTER = float(os.getenv("BLOCKCHAIN_RPC_RETRY_AFTER", "30"))
+
+# "direct" sends one blockchain transaction per ledger row, "batch" stores a Merkle leaf per row
+# and lets the anchor_transactions command write a single root for each batch of rows
+BLOCKCHAIN_ANCHOR_MODE = os.getenv("BLOCKCHAIN_ANCHOR_MODE", "direct")
+BLOCKCHAIN_ANCHOR_BATCH_SIZE = int(os.getenv("BLOCKCHAIN_ANCHOR_BATCH_SIZE", "1000"))
+# Most expenses accepted by one batch submission; each batch is anchored under a single Merkle root
+EXPENSE_BATCH_MAX_SIZE = int(os.getenv("EXPENSE_BATCH_MAX_SIZE", "1000"))
+
+# Cursor pagination of transaction feeds
+TRANSACTION_PAGE_SIZE = int(os.getenv("TRANSACTION_PAGE_SIZE", "100"))
+TRANSACTION_MAX_PAGE_SIZE = int(os.getenv("TRANSACTION_MAX_PAGE_SIZE", "1000"))
+# Rows fetched per round trip while streaming a ledger export
+TRANSACTION_EXPORT_CHUNK_SIZE = int(os.getenv("TRANSACTION_EXPORT_CHUNK_SIZE", "2000"))
+
+# Depth after which a mined transaction is treated as final
+BLOCKCHAIN_CONFIRMATIONS = int(os.getenv("BLOCKCHAIN_CONFIRMATIONS", "12"))
+# Seconds after sending a chain write without a receipt before its rows are marked failed
+BLOCKCHAIN_RECEIPT_TIMEOUT = int(os.getenv("BLOCKCHAIN_RECEIPT_TIMEOUT", "1800"))
+
+# Retry policy for queued blockchain writes (seconds)
+CHAIN_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAIN_WRITE_MAX_ATTEMPTS", "8"))
+CHAIN_WRITE_BACKOFF = int(os.getenv("CHAIN_WRITE_BACKOFF", "5"))
+CHAIN_WRITE_MAX_BACKOFF = int(os.getenv("CHAIN_WRITE_MAX_BACKOFF", "600"))
+# How long an outbox entry or anchor batch claimed by a worker is left to it before it is retried
+CHAIN_WRITE_CLAIM_TIMEOUT = int(os.getenv("CHAIN_WRITE_CLAIM_TIMEOUT", "120"))
+
+# One JSON line per request with its timings (see ngo_backend.metrics); off unless set to INFO
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "ngo_backend.requests": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
+# Who may scrape /metrics: a Prometheus bearer token, or the listed client addresses
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+
+# In-process cache of API tokens and NGO admin lookups (users.cache). Changes made in this process
+# apply at once; other worker processes see revoked tokens within the TTL. A TTL of 0 disables it.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/users/", include("users.urls")),  # User-related URLs
     path("api/ngos/", include("ngos.urls")),  # NGO-related URLs
     path("api/transactions/", include("transactions.urls")),  # Transaction-related URLs
+    path("metrics", metrics_view, name="metrics"),  # Prometheus scrape endpoint
 ]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NgosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ngos'
+
+    def ready(self):
+        # Drop cached NGO responses when an NGO is created, changed or deleted
+        from . import signals  # noqa: F401
@@ -0,0 +1,98 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from transactions.ledger import arecord_transaction
+from users.authentication import authenticate_token
+from .models import NGO
+from .views import DonateToNGOView, OutgoingTransactionView
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    """
+    Base for the async endpoints. DRF's APIView cannot run async handlers, so this covers what
+    those endpoints used from it: token authentication, the permission classes of sync_view (the
+    APIView serving the same endpoint under WSGI) and JSON request bodies as request.data.
+    """
+
+    sync_view = None
+
+    def get_permissions(self):
+        return [permission() for permission in self.sync_view.permission_classes]
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await authenticate_token(request) or AnonymousUser()
+        for permission in self.get_permissions():
+            if permission.has_permission(request, self):
+                continue
+            # Same answers as APIView.permission_denied
+            if not request.user.is_authenticated:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=401,
+                    headers={"WWW-Authenticate": "Token"},
+                )
+            message = getattr(permission, "message", None) or "You do not have permission to perform this action."
+            return JsonResponse({"detail": message}, status=403)
+
+        try:
+            if request.content_type == "application/json":
+                request.data = json.loads(request.body or b"{}")
+            else:
+                request.data = request.POST
+        except ValueError as e:
+            return JsonResponse({"detail": f"JSON parse error - {e}"}, status=400)
+
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def record_response(**fields):
+    transaction = await arecord_transaction(**fields)
+    if transaction:
+        return JsonResponse(
+            {"transaction_hash": transaction.blockchain_hash, "leaf_hash": transaction.leaf_hash}, status=201
+        )
+    return JsonResponse({"error": "Failed to record transaction on blockchain"}, status=500)
+
+
+class AsyncDonateToNGOView(AsyncAPIView):
+    sync_view = DonateToNGOView
+
+    async def post(self, request, ngo_id):
+        try:
+            ngo = await NGO.objects.aget(id=ngo_id)
+        except NGO.DoesNotExist:
+            return JsonResponse({"error": "NGO not found"}, status=404)
+
+        return await record_response(
+            ngo=ngo, transaction_type="donation", amount=request.data.get("amount"), user=request.user
+        )
+
+
+class AsyncOutgoingTransactionView(AsyncAPIView):
+    sync_view = OutgoingTransactionView
+
+    async def get(self, request, ngo_id):
+        # Reading the feed does no network I/O, so it is served by the regular view
+        return await sync_to_async(OutgoingTransactionView.as_view())(request, ngo_id=ngo_id)
+
+    async def post(self, request, ngo_id):
+        try:
+            ngo = await NGO.objects.aget(id=ngo_id)
+        except NGO.DoesNotExist:
+            return JsonResponse({"error": "NGO not found"}, status=404)
+
+        return await record_response(
+            ngo=ngo,
+            transaction_type="expense",
+            amount=request.data.get("amount"),
+            proof_url=request.data.get("proof_url"),
+            description=request.data.get("description"),
+            user=request.user,
+        )
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+NGO_LIST_KEY = "ngos:list"
+
+# How long a request waits for another one that is already building the same payload
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT = 2
+BUILD_POLL_INTERVAL = 0.05
+
+
+def ngo_detail_key(ngo_id):
+    return f"ngos:detail:{ngo_id}"
+
+
+def _version(key):
+    # Keys are versioned so a payload built from data read before an invalidation is never served after it
+    version = cache.get(f"{key}:version")
+    if version is None:
+        cache.add(f"{key}:version", 1, None)
+        version = cache.get(f"{key}:version", 1)
+    return version
+
+
+def invalidate(*keys):
+    for key in keys:
+        try:
+            cache.incr(f"{key}:version")
+        except ValueError:
+            cache.set(f"{key}:version", 2, None)
+
+
+def invalidate_ngos(ngo_ids, listing=False):
+    """Drop the cached detail payloads of these NGOs, and the NGO list if listing is True."""
+    keys = [ngo_detail_key(ngo_id) for ngo_id in ngo_ids]
+    invalidate(*keys, *([NGO_LIST_KEY] if listing else []))
+
+
+def _entry(payload):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True)
+    return {
+        "payload": payload,
+        "etag": '"' + hashlib.md5(body.encode()).hexdigest() + '"',
+        "fresh_until": time.time() + settings.NGO_RESPONSE_CACHE_TIMEOUT,
+    }
+
+
+def _store(entry_key, payload):
+    entry = _entry(payload)
+    # Kept past its freshness so one request can rebuild it while the others serve the old copy
+    cache.set(entry_key, entry, settings.NGO_RESPONSE_CACHE_TIMEOUT * 2)
+    return entry
+
+
+def get_cached_entry(key, build):
+    """
+    Return the cached {"payload", "etag"} entry for key, calling build() to (re)create it.
+
+    Only the request that wins the build lock calls build(). When a fresh entry expires the
+    others keep serving the stale one meanwhile; when there is no entry at all they wait up to
+    BUILD_WAIT seconds for it before building it themselves. With NGO_RESPONSE_CACHE_TIMEOUT
+    at 0 every call builds the entry.
+    """
+    if not settings.NGO_RESPONSE_CACHE_TIMEOUT:
+        return _entry(build())
+
+    entry_key = f"{key}:{_version(key)}"
+    lock_key = f"{entry_key}:lock"
+    entry = cache.get(entry_key)
+
+    if entry and entry["fresh_until"] > time.time():
+        return entry
+
+    if cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT):
+        try:
+            return _store(entry_key, build())
+        finally:
+            cache.delete(lock_key)
+
+    if entry:
+        return entry
+
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        entry = cache.get(entry_key)
+        if entry:
+            return entry
+    return _store(entry_key, build())
+
+
+def cached_response(request, key, build):
+    """Response for a cached payload, answering 304 when the client already has the current ETag."""
+    entry = get_cached_entry(key, build)
+    if request.headers.get("If-None-Match") == entry["etag"]:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry["payload"], status=status.HTTP_200_OK)
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0004_ngo_work_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainNonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('next_nonce', models.PositiveBigIntegerField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:19
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Name weighs more than description when ranking. A trigger rather than save() keeps rows written
+# with bulk_create or COPY searchable too. Must use the configuration in transactions.search.
+VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}.name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}.description, '')), 'B')"
+)
+
+CREATE_SQL = f"""
+CREATE FUNCTION ngos_ngo_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {VECTOR.format(row="NEW")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ngos_ngo_search_vector BEFORE INSERT OR UPDATE OF name, description ON ngos_ngo
+FOR EACH ROW EXECUTE FUNCTION ngos_ngo_search_vector();
+
+UPDATE ngos_ngo SET search_vector = {VECTOR.format(row="ngos_ngo")};
+
+CREATE INDEX ngo_search_idx ON ngos_ngo USING gin (search_vector);
+"""
+
+DROP_SQL = """
+DROP INDEX ngo_search_idx;
+DROP TRIGGER ngos_ngo_search_vector ON ngos_ngo;
+DROP FUNCTION ngos_ngo_search_vector();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Other databases keep the column empty and search with substring matching
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0005_chainnonce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ngo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
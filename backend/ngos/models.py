@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -9,6 +10,18 @@ class NGO(models.Model):
     admin = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.TextField(blank=True, null=True)
     work_images = models.JSONField(default=list, blank=True, help_text="List of image URLs showing NGO's work")
+    # Weighted name and description for full-text search, kept up to date by a trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
+
+
+class ChainNonce(models.Model):
+    """Next nonce to use for a signing account, shared by every worker process."""
+
+    address = models.CharField(max_length=42, unique=True)
+    next_nonce = models.PositiveBigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.address} - {self.next_nonce}"
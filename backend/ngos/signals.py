@@ -0,0 +1,13 @@
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_ngos
+from .models import NGO
+
+
+@receiver([post_save, post_delete], sender=NGO)
+def invalidate_ngo_responses(sender, instance, **kwargs):
+    # Created, edited (here or in the admin) and deleted NGOs all change the public list
+    ngo_id = instance.id
+    db_transaction.on_commit(lambda: invalidate_ngos([ngo_id], listing=True))
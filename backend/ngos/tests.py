@@ -1,3 +1,306 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction as db_transaction
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAdminUser
+
+from ngos.async_views import AsyncDonateToNGOView, AsyncOutgoingTransactionView
+from ngos.models import ChainNonce
+from ngos.utils import NonceManager, Web3Registry, acreate_blockchain_record, create_blockchain_record
+from ngos.views import DonateToNGOView
+from tests.fixtures import ConstantQueriesMixin, NGOTestCase, create_ngo
+from transactions.aggregates import (
+    rebuild_activity_rollups,
+    rebuild_ledger_summaries,
+    update_activity_rollups,
+    update_ledger_summaries,
+)
+from transactions.async_views import AsyncCreateOrderView, AsyncPaymentVerificationView
+from transactions.models import AnchorBatch, Transaction
+
+
+class NonceManagerTest(TestCase):
+    def setUp(self):
+        self.manager = NonceManager("0x90F8bf6A479f320ead074411a4B0e7944Ea8c9C1")
+
+    def test_reads_the_pending_count_from_the_node_only_without_a_stored_nonce(self):
+        with mock.patch("ngos.utils.web3_registry.call", return_value=7) as rpc:
+            self.assertEqual([self.manager.allocate() for _ in range(3)], [7, 8, 9])
+            self.manager.resync()
+            self.assertEqual(self.manager.allocate(), 7)
+        self.assertEqual(rpc.call_count, 2)
+
+    def test_rolled_back_allocation_does_not_consume_the_nonce(self):
+        ChainNonce.objects.create(address=self.manager.address, next_nonce=3)
+        with self.assertRaises(RuntimeError):
+            with db_transaction.atomic():
+                self.assertEqual(self.manager.allocate(), 3)
+                raise RuntimeError("send failed")
+        self.assertEqual(self.manager.allocate(), 3)
+
+
+@override_settings(BLOCKCHAIN_RPC_URLS=["http://rpc-a", "http://rpc-b"], BLOCKCHAIN_RPC_RETRY_AFTER=30)
+class Web3RegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = Web3Registry()
+        self.down = {"http://rpc-a"}
+        self.tried = []
+
+    def endpoint(self, w3):
+        endpoint = w3.provider.endpoint_uri
+        self.tried.append(endpoint)
+        if endpoint in self.down:
+            raise requests.ConnectionError(f"{endpoint} refused the connection")
+        return endpoint
+
+    def test_fails_over_and_skips_the_failed_endpoint(self):
+        self.assertEqual(self.registry.call(self.endpoint), "http://rpc-b")
+        self.assertEqual(self.registry.call(self.endpoint), "http://rpc-b")
+        self.assertEqual(self.tried, ["http://rpc-a", "http://rpc-b", "http://rpc-b"])
+        self.assertEqual(self.registry.endpoints(), ["http://rpc-b"])
+
+    def test_failed_endpoint_is_tried_again_after_the_retry_delay(self):
+        with mock.patch("ngos.utils.time.monotonic", return_value=1000):
+            self.registry.call(self.endpoint)
+        self.down.clear()
+        with mock.patch("ngos.utils.time.monotonic", return_value=1031):
+            self.assertEqual(self.registry.call(self.endpoint), "http://rpc-a")
+
+    def test_every_endpoint_is_tried_when_all_are_down(self):
+        self.down = {"http://rpc-a", "http://rpc-b"}
+        with self.assertRaises(requests.ConnectionError):
+            self.registry.call(self.endpoint)
+        self.assertEqual(self.registry.endpoints(), ["http://rpc-a", "http://rpc-b"])
+        self.down = {"http://rpc-b"}
+        self.assertEqual(self.registry.call(self.endpoint), "http://rpc-a")
+
+
+class BlockchainRecordTest(SimpleTestCase):
+    def test_failed_writes_are_logged_with_their_traceback(self):
+        error = requests.ConnectionError("node unreachable")
+        with mock.patch("ngos.utils.send_signed_transaction", side_effect=error):
+            with self.assertLogs("ngos.utils", "ERROR") as logs:
+                self.assertIsNone(create_blockchain_record(b"payload"))
+        with mock.patch("ngos.utils.asend_signed_transaction", side_effect=error):
+            with self.assertLogs("ngos.utils", "ERROR") as async_logs:
+                self.assertIsNone(async_to_sync(acreate_blockchain_record)(b"payload"))
+
+        for record in (logs.records[0], async_logs.records[0]):
+            self.assertEqual(record.getMessage(), "Error recording transaction")
+            self.assertIs(record.exc_info[1], error)
+
+
+class NGOLedgerQueryTest(ConstantQueriesMixin, NGOTestCase):
+    def test_detail_query_count_is_constant(self):
+        response = self.assertConstantQueries(reverse("ngo_detail", args=[self.ngo.id]), 3)
+        self.assertEqual(response.data["admin"], "ngo_admin")
+        self.assertEqual(len(response.data["donations"]) + len(response.data["expenses"]), 21)
+
+    def test_incoming_query_count_is_constant(self):
+        response = self.assertConstantQueries(reverse("incoming_transactions", args=[self.ngo.id]), 1)
+        self.assertTrue(all(tx["user"].startswith("donor_") for tx in response.data))
+
+    def test_outgoing_query_count_is_constant(self):
+        response = self.assertConstantQueries(reverse("outgoing_transactions", args=[self.ngo.id]), 1)
+        self.assertTrue(all("description" in tx for tx in response.data))
+
+
+class NGOSummaryTest(NGOTestCase):
+    def test_summary_matches_rebuild(self):
+        self.add_transactions(7)
+        update_ledger_summaries(Transaction.objects.all())
+        with self.assertNumQueries(1):
+            incremental = self.client.get(reverse("ngo_summary", args=[self.ngo.id])).data
+
+        rebuild_ledger_summaries()
+        rebuilt = self.client.get(reverse("ngo_summary", args=[self.ngo.id])).data
+
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(incremental["donation_count"], 3)
+        self.assertEqual(incremental["expense_count"], 4)
+        self.assertEqual(incremental["balance"], -100)
+
+
+class NGOTimeseriesTest(NGOTestCase):
+    def test_timeseries_matches_backfill(self):
+        self.add_transactions(5)
+        update_activity_rollups(Transaction.objects.all())
+        url = reverse("ngo_timeseries", args=[self.ngo.id]) + "?bucket=month"
+        with self.assertNumQueries(1):
+            incremental = self.client.get(url).data
+
+        rebuild_activity_rollups()
+        self.assertEqual(self.client.get(url).data, incremental)
+        self.assertEqual(len(incremental["timestamps"]), 1)
+        self.assertEqual(incremental["donated"], [200.0])
+        self.assertEqual(incremental["spent"], [300.0])
+
+    def test_unknown_bucket_is_rejected(self):
+        response = self.client.get(reverse("ngo_timeseries", args=[self.ngo.id]) + "?bucket=hour")
+        self.assertEqual(response.status_code, 400)
+
+
+class NGOResponseCacheTest(NGOTestCase):
+    def test_detail_is_cached_until_invalidated(self):
+        url = reverse("ngo_detail", args=[self.ngo.id])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, first.data)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse("ngo_update", args=[self.ngo.id]), {"name": "Heal the Earth"}, format="json")
+        updated = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(updated.data["name"], "Heal the Earth")
+        self.assertEqual(self.client.get(reverse("list_ngos")).data[0]["name"], "Heal the Earth")
+
+    def test_list_is_invalidated_when_ngos_are_created_and_deleted(self):
+        url = reverse("list_ngos")
+        self.assertEqual(len(self.client.get(url).data), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = create_ngo(User.objects.create_user(username="other_admin"), name="Plant a Tree")
+        self.assertEqual([ngo["name"] for ngo in self.client.get(url).data], ["Help the Earth", "Plant a Tree"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual([ngo["name"] for ngo in self.client.get(url).data], ["Help the Earth"])
+
+
+@override_settings(BLOCKCHAIN_ANCHOR_MODE="batch")
+class AsyncChainWriteViewTest(NGOTestCase):
+    def post(self, view, data, token=None):
+        headers = {"Authorization": f"Token {token.key}"} if token else {}
+        request = AsyncRequestFactory().post("/", json.dumps(data), content_type="application/json", headers=headers)
+        return view.as_view()(request, ngo_id=self.ngo.id)
+
+    async def test_requires_token(self):
+        for view in (AsyncDonateToNGOView, AsyncOutgoingTransactionView, AsyncCreateOrderView):
+            response = await self.post(view, {"amount": "10"})
+            self.assertEqual(response.status_code, 401, view.__name__)
+        request = AsyncRequestFactory().post("/", "{}", content_type="application/json")
+        self.assertEqual((await AsyncPaymentVerificationView.as_view()(request)).status_code, 401)
+
+    async def test_applies_the_permissions_of_the_sync_view(self):
+        token = await Token.objects.acreate(user=self.admin)
+        with mock.patch.object(DonateToNGOView, "permission_classes", [IsAdminUser]):
+            response = await self.post(AsyncDonateToNGOView, {"amount": "10"}, token)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(await Transaction.objects.aexists())
+
+    async def test_donation_and_expense_are_recorded(self):
+        token = await Token.objects.acreate(user=self.admin)
+        donation = await self.post(AsyncDonateToNGOView, {"amount": "250.00"}, token)
+        expense = await self.post(AsyncOutgoingTransactionView, {"amount": "40", "description": "Seeds"}, token)
+
+        self.assertEqual((donation.status_code, expense.status_code), (201, 201))
+        rows = [row async for row in Transaction.objects.order_by("id").values("transaction_type", "leaf_hash")]
+        self.assertEqual([row["transaction_type"] for row in rows], ["donation", "expense"])
+        self.assertEqual(json.loads(expense.content)["leaf_hash"], rows[1]["leaf_hash"])
+
+
+class RequestMetricsTest(NGOTestCase):
+    def test_timings_are_published(self):
+        with self.assertLogs("ngo_backend.requests") as logs:
+            response = self.client.get(reverse("ngo_summary", args=[self.ngo.id]))
+        self.assertTrue(response["Server-Timing"].startswith("app;dur="))
+        # No summary row yet, so the view also checks that the NGO exists
+        self.assertIn('db;dur=', response["Server-Timing"])
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+        route = "api/ngos/<int:ngo_id>/summary/"
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["route"], line["status"], line["db_calls"]), (route, 200, 2))
+
+        metrics = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn(f'ngo_http_requests_total{{route="{route}",method="GET",status="200"}}', metrics)
+        self.assertIn(f'ngo_db_queries_total{{route="{route}"}}', metrics)
+
+    @override_settings(METRICS_TOKEN="scrape-secret", METRICS_ALLOWED_IPS=[])
+    def test_metrics_need_the_token_off_the_allowed_addresses(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        headers = {"Authorization": "Bearer scrape-secret"}
+        self.assertEqual(self.client.get(reverse("metrics"), headers=headers).status_code, 200)
+
+    def test_admin_view_without_ngo_is_not_found(self):
+        self.client.force_authenticate(User.objects.create_user(username="donor"))
+        self.assertEqual(self.client.get(reverse("ngo_admin")).status_code, 404)
+
+
+@override_settings(BLOCKCHAIN_ANCHOR_MODE="batch", BLOCKCHAIN_RPC_URLS=["http://127.0.0.1:9"])
+class BatchExpenseTest(NGOTestCase):
+    def test_json_batch_is_inserted_together(self):
+        expenses = [{"amount": "120.50", "description": "Seeds"}, {"amount": 80, "proof_url": "https://example.com/r"}]
+        response = self.client.post(reverse("batch_expenses", args=[self.ngo.id]), expenses, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        rows = list(Transaction.objects.order_by("id").values("id", "transaction_type", "leaf_hash", "status"))
+        self.assertEqual([row["transaction_type"] for row in rows], ["expense", "expense"])
+        # The chain is unreachable here, so the rows wait for the next anchoring
+        self.assertEqual(
+            [(item["index"], item["id"], item["leaf_hash"], item["status"]) for item in response.data["results"]],
+            [(i, row["id"], row["leaf_hash"], "pending") for i, row in enumerate(rows)],
+        )
+        self.assertEqual(self.client.get(reverse("ngo_summary", args=[self.ngo.id])).data["expense_count"], 2)
+
+    @override_settings(BLOCKCHAIN_ANCHOR_MODE="direct")
+    def test_direct_mode_inserts_the_rows_after_the_chain_write(self):
+        def send(payload):
+            self.assertFalse(Transaction.objects.exists())
+            return "0x" + "ef" * 32
+
+        url = reverse("batch_expenses", args=[self.ngo.id])
+        with mock.patch("transactions.ledger.create_blockchain_record", side_effect=send):
+            response = self.client.post(url, [{"amount": "12"}, {"amount": "30"}], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({item["status"] for item in response.data["results"]}, {"pending"})
+        merkle_root = response.data["merkle_root"]
+        self.assertEqual(Transaction.objects.filter(anchor__merkle_root=merkle_root).count(), 2)
+
+        # The chain is unreachable here, so the next batch is kept as failed and not counted
+        response = self.client.post(url, [{"amount": "5"}], format="json")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(Transaction.objects.filter(status="failed").count(), 1)
+        self.assertEqual(self.client.get(reverse("ngo_summary", args=[self.ngo.id])).data["expense_count"], 2)
+        # No batch is left behind for the write that failed
+        self.assertEqual(list(AnchorBatch.objects.values_list("merkle_root", flat=True)), [merkle_root])
+
+    def test_csv_upload_with_invalid_rows_records_nothing(self):
+        upload = SimpleUploadedFile(
+            "expenses.csv", b'amount,proof_url,description\n10,,"Rice, 5kg"\n-4,,Refund\nabc,not-a-url,\n'
+        )
+        response = self.client.post(reverse("batch_expenses", args=[self.ngo.id]), {"file": upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item["index"] for item in response.data["results"]], [1, 2])
+        self.assertEqual(set(response.data["results"][1]["errors"]), {"amount", "proof_url"})
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_only_the_ngo_admin_can_submit(self):
+        self.client.force_authenticate(User.objects.create_user(username="donor"))
+        response = self.client.post(reverse("batch_expenses", args=[self.ngo.id]), [{"amount": "5"}], format="json")
+        self.assertEqual(response.status_code, 404)
+
+
+class NGOSearchTest(NGOTestCase):
+    def test_search_pages_through_matching_ngos(self):
+        for i in range(3):
+            create_ngo(self.admin, name=f"Clean Water {i}")
+        url = reverse("search_ngos")
+
+        first = self.client.get(url, {"q": "water", "page_size": 2})
+        second = self.client.get(url, {"q": "water", "page_size": 2, "cursor": first["X-Next-Cursor"]})
+        names = [ngo["name"] for ngo in first.data + second.data]
+        self.assertEqual(sorted(names), ["Clean Water 0", "Clean Water 1", "Clean Water 2"])
+        self.assertEqual(self.client.get(url).status_code, 400)
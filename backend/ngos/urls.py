@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.urls import path
+from .async_views import AsyncDonateToNGOView, AsyncOutgoingTransactionView
 from .views import (
+    BatchExpenseView,
     DonateToNGOView,
     ListNGOsView,
     NGODetailView,
+    NGOSearchView,
+    NGOSummaryView,
+    NGOTimeseriesView,
     OutgoingTransactionView,
     IncomingTransactionView,
     NGOAdminView,
@@ -11,9 +17,22 @@ from .views import (
 
 urlpatterns = [
     path("", ListNGOsView.as_view(), name="list_ngos"),
+    path("search/", NGOSearchView.as_view(), name="search_ngos"),
     path("<int:ngo_id>/", NGODetailView.as_view(), name="ngo_detail"),
-    path("<int:ngo_id>/donate/", DonateToNGOView.as_view(), name="donate_to_ngo"),
-    path("<int:ngo_id>/outgoing/", OutgoingTransactionView.as_view(), name="outgoing_transactions"),
+    path("<int:ngo_id>/summary/", NGOSummaryView.as_view(), name="ngo_summary"),
+    path("<int:ngo_id>/timeseries/", NGOTimeseriesView.as_view(), name="ngo_timeseries"),
+    # The chain-write endpoints have async versions for ASGI deployments
+    path(
+        "<int:ngo_id>/donate/",
+        (AsyncDonateToNGOView if settings.ASYNC_VIEWS else DonateToNGOView).as_view(),
+        name="donate_to_ngo",
+    ),
+    path(
+        "<int:ngo_id>/outgoing/",
+        (AsyncOutgoingTransactionView if settings.ASYNC_VIEWS else OutgoingTransactionView).as_view(),
+        name="outgoing_transactions",
+    ),
+    path("<int:ngo_id>/outgoing/batch/", BatchExpenseView.as_view(), name="batch_expenses"),
     path("<int:ngo_id>/incoming/", IncomingTransactionView.as_view(), name="incoming_transactions"),
     path("admin/ngo/", NGOAdminView.as_view(), name="ngo_admin"),
     path("admin/ngo/<int:ngo_id>/", NGOUpdateView.as_view(), name="ngo_update"),
@@ -1,49 +1,277 @@
-from web3 import Web3
+from web3 import AsyncWeb3, Web3
+from eth_account import Account
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+import aiohttp
+import asyncio
+import logging
 import os
+import threading
+import time
+import requests
+
+from ngo_backend.metrics import timed
+from .models import ChainNonce
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables (if using environment variables for security)
 ACCOUNT_ADDRESS = os.getenv("ACCOUNT_ADDRESS", "0x90F8bf6A479f320ead074411a4B0e7944Ea8c9C1")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY", "0x4f3edf983ac636a65a842ce7c78d9aa706d3b113bce9c46f30d7d21715b23b1d")
 
-# Connect to Ganache blockchain
-w3 = Web3(Web3.HTTPProvider("http://ganache:8545"))
 
-# Check connection to blockchain
-if not w3.is_connected():
-    raise Exception("Failed to connect to blockchain")
+class Web3Registry:
+    """
+    Web3 clients for the RPC endpoints in BLOCKCHAIN_RPC_URLS, created on first use.
+
+    Nothing connects at import time. Every client shares one keep-alive session, and an
+    endpoint that fails with a connection error is marked down for BLOCKCHAIN_RPC_RETRY_AFTER
+    seconds while calls fail over to the next endpoint in the list.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._clients = {}
+        self._down_until = {}
+
+    def client(self, endpoint):
+        with self._lock:
+            if endpoint not in self._clients:
+                if self._session is None:
+                    self._session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=len(settings.BLOCKCHAIN_RPC_URLS),
+                        pool_maxsize=settings.BLOCKCHAIN_RPC_POOL_SIZE,
+                    )
+                    self._session.mount("http://", adapter)
+                    self._session.mount("https://", adapter)
+
+                provider = Web3.HTTPProvider(
+                    endpoint,
+                    request_kwargs={"timeout": settings.BLOCKCHAIN_RPC_TIMEOUT},
+                    session=self._session,
+                    # Fail over to the next endpoint instead of retrying a dead one
+                    exception_retry_configuration=None,
+                )
+                self._clients[endpoint] = Web3(provider)
+            return self._clients[endpoint]
+
+    def endpoints(self):
+        """Endpoints in failover order; ones marked down are skipped unless every endpoint is down."""
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in settings.BLOCKCHAIN_RPC_URLS if self._down_until.get(endpoint, 0) <= now]
+        return healthy or list(settings.BLOCKCHAIN_RPC_URLS)
 
+    def call(self, fn):
+        """Run fn(w3) against the first endpoint that answers."""
+        error = None
+        for endpoint in self.endpoints():
+            try:
+                with timed("rpc"):
+                    return fn(self.client(endpoint))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._down_until[endpoint] = time.monotonic() + settings.BLOCKCHAIN_RPC_RETRY_AFTER
+                error = e
+        raise error
 
-def create_blockchain_record(amount, transaction_type, ngo_id):
+
+web3_registry = Web3Registry()
+
+
+class AsyncWeb3Registry(Web3Registry):
     """
-    Record a transaction on the blockchain (donation or expense).
-    Returns the transaction hash or None if failed.
+    AsyncWeb3 clients for BLOCKCHAIN_RPC_URLS with the same failover rules as Web3Registry.
+    web3 keeps a pooled aiohttp session per endpoint and event loop.
+    """
+
+    def client(self, endpoint):
+        with self._lock:
+            if endpoint not in self._clients:
+                provider = AsyncWeb3.AsyncHTTPProvider(
+                    endpoint,
+                    request_kwargs={"timeout": aiohttp.ClientTimeout(total=settings.BLOCKCHAIN_RPC_TIMEOUT)},
+                    exception_retry_configuration=None,
+                )
+                self._clients[endpoint] = AsyncWeb3(provider)
+            return self._clients[endpoint]
+
+    async def call(self, fn):
+        """Await fn(w3) against the first endpoint that answers."""
+        error = None
+        for endpoint in self.endpoints():
+            try:
+                with timed("rpc"):
+                    return await fn(self.client(endpoint))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._down_until[endpoint] = time.monotonic() + settings.BLOCKCHAIN_RPC_RETRY_AFTER
+                error = e
+        raise error
+
+
+async_web3_registry = AsyncWeb3Registry()
+
+
+class NonceManager:
+    """
+    Hands out sequential nonces for a signing account without asking the node each time.
+
+    The next nonce lives in a ChainNonce row that is locked with SELECT ... FOR UPDATE while
+    it is read and bumped, so threads and separate gunicorn workers never receive the same
+    nonce. The node is only queried when the row has no value yet or after a resync.
     """
+
+    def __init__(self, address):
+        self.address = address
+
+    def allocate(self):
+        ChainNonce.objects.get_or_create(address=self.address)
+        with transaction.atomic():
+            counter = ChainNonce.objects.select_for_update().get(address=self.address)
+            nonce = counter.next_nonce
+            if nonce is None:
+                nonce = web3_registry.call(lambda w3: w3.eth.get_transaction_count(self.address, "pending"))
+            counter.next_nonce = nonce + 1
+            counter.save(update_fields=["next_nonce"])
+        return nonce
+
+    def resync(self):
+        """Forget the stored nonce so the next allocation reads the pending count from the node."""
+        ChainNonce.objects.filter(address=self.address).update(next_nonce=None)
+
+
+nonce_manager = NonceManager(ACCOUNT_ADDRESS)
+
+
+def is_nonce_error(error):
+    message = str(error).lower()
+    # geth/anvil say "nonce too low", ganache says "the tx doesn't have the correct nonce"
+    return "nonce too low" in message or "correct nonce" in message
+
+
+def send_signed_transaction(transaction_data, retries=1):
+    """
+    Sign and send a transaction using the next nonce from the nonce manager.
+    Resyncs the nonce and retries when the node rejects it as stale.
+    """
+    transaction_data = {**transaction_data, "nonce": nonce_manager.allocate()}
+    signed_transaction = Account.sign_transaction(transaction_data, PRIVATE_KEY)
+    try:
+        tx_hash = web3_registry.call(lambda w3: w3.eth.send_raw_transaction(signed_transaction.raw_transaction))
+    except Exception as e:
+        # Whatever went wrong, the stored nonce may now be ahead of (or behind) the node
+        nonce_manager.resync()
+        if retries > 0 and is_nonce_error(e):
+            return send_signed_transaction(transaction_data, retries=retries - 1)
+        raise
+    return tx_hash.hex()
+
+
+async def asend_signed_transaction(transaction_data, retries=1):
+    """Async send_signed_transaction; the nonce row is locked in a worker thread and the send is awaited."""
+    transaction_data = {**transaction_data, "nonce": await sync_to_async(nonce_manager.allocate)()}
+    signed_transaction = Account.sign_transaction(transaction_data, PRIVATE_KEY)
     try:
-        # Check if enough balance is available
-        balance = w3.eth.get_balance(ACCOUNT_ADDRESS)
-        print(f"Account balance: {balance} wei")
-
-        # Set nonce for transaction
-        nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-
-        # Set up transaction with reduced values
-        transaction_data = {
-            "from": ACCOUNT_ADDRESS,
-            "to": ACCOUNT_ADDRESS,  # For demonstration, sending to the same account
-            "value": w3.to_wei(0.001, "ether"),  # Use a smaller amount
-            "gas": 21000,  # Minimum gas limit for a simple transfer
-            "gasPrice": w3.to_wei("1", "gwei"),  # Lower gas price
-            "nonce": nonce,
-        }
-
-        # Sign the transaction
-        signed_transaction = w3.eth.account.sign_transaction(transaction_data, PRIVATE_KEY)
-
-        # Send the transaction
-        tx_hash = w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
-
-        # Return the transaction hash
-        return tx_hash.hex()
+        tx_hash = await async_web3_registry.call(
+            lambda w3: w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+        )
     except Exception as e:
-        print(f"Error recording transaction: {e}")
+        await sync_to_async(nonce_manager.resync)()
+        if retries > 0 and is_nonce_error(e):
+            return await asend_signed_transaction(transaction_data, retries=retries - 1)
+        raise
+    return tx_hash.hex()
+
+
+def intrinsic_gas(data=b""):
+    # 21000 base cost plus calldata: 4 gas per zero byte, 16 per non-zero byte
+    return 21000 + sum(4 if byte == 0 else 16 for byte in data)
+
+
+def ledger_write(payload):
+    """A zero value self-transfer carrying an encoded ledger record (see transactions.payload) as its data."""
+    return {
+        "from": ACCOUNT_ADDRESS,
+        "to": ACCOUNT_ADDRESS,
+        "value": 0,
+        "data": payload,
+        "gas": intrinsic_gas(payload),
+        "gasPrice": Web3.to_wei("1", "gwei"),
+    }
+
+
+def create_blockchain_record(payload):
+    """
+    Record an encoded ledger record on the blockchain.
+    Returns the transaction hash or None if failed.
+    """
+    try:
+        # Sign and send with a locally allocated nonce (one RPC round trip)
+        return send_signed_transaction(ledger_write(payload))
+    except Exception:
+        logger.exception("Error recording transaction")
+        return None
+
+
+async def acreate_blockchain_record(payload):
+    """Async create_blockchain_record for async views."""
+    try:
+        return await asend_signed_transaction(ledger_write(payload))
+    except Exception:
+        logger.exception("Error recording transaction")
         return None
+
+
+def get_transaction_receipts(transaction_hashes):
+    """
+    Fetch the latest block number and the receipts for many transactions in one batched JSON-RPC request.
+    Returns (block_number, {transaction_hash: receipt}); receipts of transactions not yet mined are None.
+    """
+    rpc_requests = [("eth_blockNumber", [])]
+    rpc_requests += [
+        ("eth_getTransactionReceipt", ["0x" + tx_hash.removeprefix("0x")]) for tx_hash in transaction_hashes
+    ]
+    responses = web3_registry.call(lambda w3: w3.provider.make_batch_request(rpc_requests))
+
+    if "error" in responses[0]:
+        raise Exception(f"Failed to fetch block number: {responses[0]['error']}")
+    block_number = int(responses[0]["result"], 16)
+
+    receipts = {}
+    for tx_hash, response in zip(transaction_hashes, responses[1:]):
+        receipts[tx_hash] = response.get("result")
+    return block_number, receipts
+
+
+def get_chain_transactions(transaction_hashes):
+    """
+    Fetch the transactions and receipts for many hashes in one batched JSON-RPC request.
+    Returns {transaction_hash: (transaction, receipt)} with None for anything the node does not know.
+    """
+    rpc_requests = []
+    for tx_hash in transaction_hashes:
+        tx_hash = "0x" + tx_hash.removeprefix("0x")
+        rpc_requests.append(("eth_getTransactionByHash", [tx_hash]))
+        rpc_requests.append(("eth_getTransactionReceipt", [tx_hash]))
+    responses = web3_registry.call(lambda w3: w3.provider.make_batch_request(rpc_requests))
+
+    return {
+        tx_hash: (responses[2 * i].get("result"), responses[2 * i + 1].get("result"))
+        for i, tx_hash in enumerate(transaction_hashes)
+    }
+
+
+def get_block_number():
+    return web3_registry.call(lambda w3: w3.eth.block_number)
+
+
+def get_blocks(block_numbers, full_transactions=False):
+    """
+    Fetch many blocks in one batched JSON-RPC request, as raw JSON-RPC dicts in the order asked.
+    Blocks the node does not have are None.
+    """
+    rpc_requests = [("eth_getBlockByNumber", [hex(number), full_transactions]) for number in block_numbers]
+    responses = web3_registry.call(lambda w3: w3.provider.make_batch_request(rpc_requests))
+    return [response.get("result") for response in responses]
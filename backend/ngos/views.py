@@ -1,65 +1,158 @@
+import csv
+import io
+from datetime import date
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from .cache import NGO_LIST_KEY, cached_response, ngo_detail_key
 from .models import NGO
-from .utils import create_blockchain_record
-from transactions.models import Transaction
+from transactions.anchoring import anchoring_enabled
+from transactions.ledger import record_transaction, record_transactions
+from transactions.models import NGOActivityRollup, NGOLedgerSummary, Transaction
+from transactions.pagination import paginate_by_cursor, paginate_by_rank, paginated_response
+from transactions.search import search
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import AllowAny
+from users.authentication import CachedTokenAuthentication
+from users.cache import admin_ngo
+
+
+DONATION_FIELDS = ("id", "amount", "user__username", "blockchain_hash", "timestamp")
+EXPENSE_FIELDS = ("id", "amount", "proof_url", "blockchain_hash", "timestamp", "description")
+# Fields an expense in a batch submission may set, and the CSV columns read for them
+EXPENSE_BATCH_FIELDS = ("amount", "proof_url", "description")
+
+
+def ledger_feed(ngo_id, transaction_type):
+    """An NGO's donations or expenses; rows whose chain write failed are not part of the ledger."""
+    return Transaction.objects.filter(ngo_id=ngo_id, transaction_type=transaction_type).exclude(status="failed")
+
+
+def serialize_donation(tx):
+    return {
+        "id": tx["id"],
+        "amount": tx["amount"],
+        "user": tx["user__username"],
+        "blockchain_hash": tx["blockchain_hash"],
+        "timestamp": tx["timestamp"],
+    }
 
 
 class ListNGOsView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        ngos = NGO.objects.all()
-        ngos_data = [{"id": ngo.id, "name": ngo.name, "logo_url": ngo.logo_url} for ngo in ngos]
-        return Response(ngos_data, status=status.HTTP_200_OK)
+        return cached_response(request, NGO_LIST_KEY, lambda: list(NGO.objects.values("id", "name", "logo_url")))
+
+
+class NGOSearchView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ngos, next_cursor = paginate_by_rank(
+                search(NGO.objects.all(), text, ("name", "description")).values("id", "name", "logo_url", "rank"),
+                request.query_params.get("cursor"),
+                request.query_params.get("page_size"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return paginated_response(request, ngos, next_cursor)
 
 
 class NGODetailView(APIView):
     def get(self, request, ngo_id):
         try:
-            ngo = NGO.objects.get(id=ngo_id)
-            ngo_data = {
-                "name": ngo.name,
-                "logo_url": ngo.logo_url,
-                "certificate_url": ngo.certificate_url,
-                "admin": ngo.admin.username,
-                "description": ngo.description,
-                "work_images": ngo.work_images,
-            }
+            return cached_response(request, ngo_detail_key(ngo_id), lambda: self.build(ngo_id))
+        except NGO.DoesNotExist:
+            return Response({"error": "NGO not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    def build(self, ngo_id):
+        ngo = NGO.objects.select_related("admin").get(id=ngo_id)
+        ngo_data = {
+            "name": ngo.name,
+            "logo_url": ngo.logo_url,
+            "certificate_url": ngo.certificate_url,
+            "admin": ngo.admin.username,
+            "description": ngo.description,
+            "work_images": ngo.work_images,
+        }
+
+        # Get the first page of each financial feed (donations and expenses), fetching only the emitted columns
+        donations, donations_cursor = paginate_by_cursor(
+            ledger_feed(ngo.id, "donation").values(*DONATION_FIELDS)
+        )
+        expenses, expenses_cursor = paginate_by_cursor(
+            ledger_feed(ngo.id, "expense").values(*EXPENSE_FIELDS)
+        )
 
-            # Get the financials (donations and expenses)
-            donations = Transaction.objects.filter(ngo=ngo, transaction_type="donation")
-            expenses = Transaction.objects.filter(ngo=ngo, transaction_type="expense")
-
-            financial_data = {
-                "donations": [
-                    {
-                        "amount": tx.amount,
-                        "user": tx.user.username,
-                        "blockchain_hash": tx.blockchain_hash,
-                        "timestamp": tx.timestamp,
-                    }
-                    for tx in donations
-                ],
-                "expenses": [
-                    {
-                        "amount": tx.amount,
-                        "proof_url": tx.proof_url,
-                        "blockchain_hash": tx.blockchain_hash,
-                        "timestamp": tx.timestamp,
-                    }
-                    for tx in expenses
-                ],
+        financial_data = {
+            "donations": [serialize_donation(tx) for tx in donations],
+            "expenses": expenses,
+            # Continue with /incoming/ and /outgoing/?cursor=...
+            "donations_next_cursor": donations_cursor,
+            "expenses_next_cursor": expenses_cursor,
+        }
+
+        return {**ngo_data, **financial_data}
+
+
+class NGOSummaryView(APIView):
+    def get(self, request, ngo_id):
+        summary = (
+            NGOLedgerSummary.objects.filter(ngo_id=ngo_id)
+            .values("total_donated", "total_spent", "balance", "donation_count", "expense_count", "last_activity")
+            .first()
+        )
+        if summary is None:
+            if not NGO.objects.filter(id=ngo_id).exists():
+                return Response({"error": "NGO not found"}, status=status.HTTP_404_NOT_FOUND)
+            # NGO without any transactions yet
+            summary = {
+                "total_donated": 0,
+                "total_spent": 0,
+                "balance": 0,
+                "donation_count": 0,
+                "expense_count": 0,
+                "last_activity": None,
             }
+        return Response(summary, status=status.HTTP_200_OK)
 
-            return Response({**ngo_data, **financial_data}, status=status.HTTP_200_OK)
 
-        except NGO.DoesNotExist:
-            return Response({"error": "NGO not found"}, status=status.HTTP_404_NOT_FOUND)
+class NGOTimeseriesView(APIView):
+    def get(self, request, ngo_id):
+        bucket = request.query_params.get("bucket", "day")
+        if bucket not in dict(NGOActivityRollup.BUCKETS):
+            return Response({"error": "bucket must be day, week or month"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = NGOActivityRollup.objects.filter(ngo_id=ngo_id, bucket=bucket)
+        try:
+            if request.query_params.get("start"):
+                rollups = rollups.filter(period_start__gte=date.fromisoformat(request.query_params["start"]))
+            if request.query_params.get("end"):
+                rollups = rollups.filter(period_start__lte=date.fromisoformat(request.query_params["end"]))
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD dates"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = rollups.order_by("period_start").values_list("period_start", "donated", "spent")
+
+        # Columnar arrays keep multi-year charts compact
+        timestamps, donated, spent = zip(*rows) if rows else ((), (), ())
+        return Response(
+            {
+                "bucket": bucket,
+                "timestamps": [period.isoformat() for period in timestamps],
+                "donated": [float(amount) for amount in donated],
+                "spent": [float(amount) for amount in spent],
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class DonateToNGOView(APIView):
@@ -67,19 +160,19 @@ class DonateToNGOView(APIView):
         ngo = NGO.objects.get(id=ngo_id)
         amount = request.data.get("amount")
 
-        # Create transaction on blockchain
-        transaction_hash = create_blockchain_record(amount, "donation", ngo.id)
-
-        if transaction_hash:
-            # Save transaction in DB
-            transaction = Transaction.objects.create(
-                ngo=ngo,
-                transaction_type="donation",
-                amount=amount,
-                blockchain_hash=transaction_hash,
-                user=request.user,  # Assuming user is authenticated
+        # Record the transaction on blockchain and in DB
+        transaction = record_transaction(
+            ngo=ngo,
+            transaction_type="donation",
+            amount=amount,
+            user=request.user,  # Assuming user is authenticated
+        )
+
+        if transaction:
+            return Response(
+                {"transaction_hash": transaction.blockchain_hash, "leaf_hash": transaction.leaf_hash},
+                status=status.HTTP_201_CREATED,
             )
-            return Response({"transaction_hash": transaction_hash}, status=status.HTTP_201_CREATED)
 
         return Response(
             {"error": "Failed to record transaction on blockchain"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -88,18 +181,15 @@ class DonateToNGOView(APIView):
 
 class OutgoingTransactionView(APIView):
     def get(self, request, ngo_id):
-        outgoing = Transaction.objects.filter(ngo_id=ngo_id, transaction_type="expense")
-        outgoing_data = [
-            {
-                "amount": tx.amount,
-                "proof_url": tx.proof_url,
-                "blockchain_hash": tx.blockchain_hash,
-                "timestamp": tx.timestamp,
-                "description": tx.description,
-            }
-            for tx in outgoing
-        ]
-        return Response(outgoing_data, status=status.HTTP_200_OK)
+        try:
+            outgoing, next_cursor = paginate_by_cursor(
+                ledger_feed(ngo_id, "expense").values(*EXPENSE_FIELDS),
+                request.query_params.get("cursor"),
+                request.query_params.get("page_size"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return paginated_response(request, outgoing, next_cursor)
 
     def post(self, request, ngo_id):
         ngo = NGO.objects.get(id=ngo_id)
@@ -107,78 +197,155 @@ class OutgoingTransactionView(APIView):
         proof_url = request.data.get("proof_url")
         description = request.data.get("description")
 
-        # Create expense on blockchain
-        transaction_hash = create_blockchain_record(amount, "expense", ngo.id)
-
-        if transaction_hash:
-            # Save transaction in DB
-            transaction = Transaction.objects.create(
-                ngo=ngo,
-                transaction_type="expense",
-                amount=amount,
-                blockchain_hash=transaction_hash,
-                proof_url=proof_url,
-                description=description,
-                user=request.user,  # Assuming user is authenticated
+        # Record the expense on blockchain and in DB
+        transaction = record_transaction(
+            ngo=ngo,
+            transaction_type="expense",
+            amount=amount,
+            proof_url=proof_url,
+            description=description,
+            user=request.user,  # Assuming user is authenticated
+        )
+
+        if transaction:
+            return Response(
+                {"transaction_hash": transaction.blockchain_hash, "leaf_hash": transaction.leaf_hash},
+                status=status.HTTP_201_CREATED,
             )
-            return Response({"transaction_hash": transaction_hash}, status=status.HTTP_201_CREATED)
 
         return Response(
             {"error": "Failed to record transaction on blockchain"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
-class IncomingTransactionView(APIView):
-    def get(self, request, ngo_id):
-        incoming = Transaction.objects.filter(ngo_id=ngo_id, transaction_type="donation")
-        incoming_data = [
+def read_expense_items(request):
+    """
+    The expenses sent to the batch endpoint: a JSON list, bare or under "expenses", or an uploaded
+    CSV file with a header row. The CSV is decoded and parsed row by row as it is iterated.
+    """
+    upload = request.FILES.get("file")
+    if upload is not None:
+        # newline="" leaves line breaks inside quoted descriptions to the csv module
+        return csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""))
+
+    items = request.data.get("expenses") if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list):
+        raise ValueError("Send a list of expenses or a CSV file")
+    return items
+
+
+def clean_expense(item):
+    """Validate one batch item against the Transaction fields. Returns (fields, errors)."""
+    if not isinstance(item, dict):
+        return None, {"non_field_errors": ["Each expense must be an object"]}
+
+    fields, errors = {}, {}
+    for name in EXPENSE_BATCH_FIELDS:
+        # Empty CSV cells mean the value was left out
+        value = item.get(name) if item.get(name) != "" else None
+        try:
+            fields[name] = Transaction._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if "amount" not in errors and fields["amount"] <= 0:
+        errors["amount"] = ["Ensure this value is greater than 0."]
+    return fields, errors
+
+
+class BatchExpenseView(APIView):
+    """
+    Record many expenses of an NGO at once, for its admin. The whole batch is validated first and
+    nothing is saved if any item is invalid; otherwise the rows go in with one insert and are
+    anchored under one Merkle root, so the batch costs a single chain write.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, ngo_id):
+        try:
+            ngo = NGO.objects.get(id=ngo_id, admin=request.user)
+        except NGO.DoesNotExist:
+            return Response({"error": "NGO not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        max_size = settings.EXPENSE_BATCH_MAX_SIZE
+        expenses, invalid = [], []
+        try:
+            for index, item in enumerate(read_expense_items(request)):
+                if index == max_size:
+                    return Response(
+                        {"error": f"A batch holds at most {max_size} expenses"}, status=status.HTTP_400_BAD_REQUEST
+                    )
+                fields, errors = clean_expense(item)
+                if errors:
+                    invalid.append({"index": index, "errors": errors})
+                else:
+                    expenses.append(Transaction(ngo=ngo, user=request.user, transaction_type="expense", **fields))
+        except (ValueError, csv.Error) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if invalid:
+            return Response(
+                {"error": "Some expenses are invalid, none were recorded", "results": invalid},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not expenses:
+            return Response({"error": "No expenses to record"}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch = record_transactions(expenses)
+        # In batch mode rows whose anchoring failed stay pending for anchor_transactions
+        if batch is None and not anchoring_enabled():
+            return Response(
+                {"error": "Failed to record transactions on blockchain"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        results = [
             {
-                "amount": tx.amount,
-                "user": tx.user.username,
-                "blockchain_hash": tx.blockchain_hash,
-                "timestamp": tx.timestamp,
+                "index": index,
+                "id": tx.id,
+                "status": tx.status,
+                "leaf_hash": tx.leaf_hash,
+                "transaction_hash": tx.blockchain_hash or None,
             }
-            for tx in incoming
+            for index, tx in enumerate(expenses)
         ]
-        return Response(incoming_data, status=status.HTTP_200_OK)
+        return Response(
+            {"merkle_root": batch.merkle_root if batch else None, "results": results},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class IncomingTransactionView(APIView):
+    def get(self, request, ngo_id):
+        try:
+            incoming, next_cursor = paginate_by_cursor(
+                ledger_feed(ngo_id, "donation").values(*DONATION_FIELDS),
+                request.query_params.get("cursor"),
+                request.query_params.get("page_size"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return paginated_response(request, [serialize_donation(tx) for tx in incoming], next_cursor)
 
 
 class NGOAdminView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            print("=== Debug Authentication ===")
-            print("User:", request.user)
-            print("User is authenticated:", request.user.is_authenticated)
-            print("Auth header:", request.headers.get("Authorization"))
-            print(
-                "Request META:",
-                {
-                    k: v
-                    for k, v in request.META.items()
-                    if k.startswith("HTTP_") or k in ["REMOTE_ADDR", "REQUEST_METHOD"]
-                },
-            )
-            print("========================")
-
-            ngo = NGO.objects.filter(admin=request.user).first()
-            ngo_data = {
-                "id": ngo.id,
-                "name": ngo.name,
-                "logo_url": ngo.logo_url,
-                "certificate_url": ngo.certificate_url,
-                "description": ngo.description,
-                "work_images": ngo.work_images,
-            }
-            return Response(ngo_data, status=status.HTTP_200_OK)
-        except NGO.DoesNotExist:
-            print(f"No NGO found for user {request.user}")
+        ngo = admin_ngo(request.user)
+        if ngo is None:
             return Response({"error": "No NGO found for this user"}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"Error in NGOAdminView: {str(e)}")
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        ngo_data = {
+            "id": ngo.id,
+            "name": ngo.name,
+            "logo_url": ngo.logo_url,
+            "certificate_url": ngo.certificate_url,
+            "description": ngo.description,
+            "work_images": ngo.work_images,
+        }
+        return Response(ngo_data, status=status.HTTP_200_OK)
 
 
 class NGOUpdateView(APIView):
@@ -0,0 +1,76 @@
+"""
+Fixtures shared by the app test suites: an NGO with its admin, a ledger that can be grown
+row by row, and the query count assertion of the ledger endpoints.
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ngos.cache import invalidate_ngos
+from ngos.models import NGO
+from transactions.models import Transaction
+from users.cache import ngo_admin_cache, token_cache
+
+
+def clear_caches():
+    """Empty the response cache and the in-process token and NGO admin caches."""
+    cache.clear()
+    token_cache.clear()
+    ngo_admin_cache.clear()
+
+
+def create_ngo(admin, name="Help the Earth"):
+    return NGO.objects.create(
+        name=name,
+        logo_url="https://example.com/logo.png",
+        certificate_url="https://example.com/cert",
+        admin=admin,
+    )
+
+
+def add_transactions(ngo, count):
+    """Add count recorded rows to ngo's ledger, alternating expenses and donations from new donors."""
+    users = User.objects.bulk_create(User(username=f"donor_{User.objects.count()}_{i}") for i in range(count))
+    Transaction.objects.bulk_create(
+        Transaction(
+            ngo=ngo,
+            user=user,
+            transaction_type="donation" if i % 2 else "expense",
+            amount=Decimal("100.00"),
+            blockchain_hash=f"{i:064x}",
+        )
+        for i, user in enumerate(users)
+    )
+    # bulk_create skips the ledger, so drop cached responses the way it would
+    invalidate_ngos([ngo.id])
+
+
+class NGOTestCase(TestCase):
+    """An NGO run by self.admin, with self.client logged in as the admin and every cache empty."""
+
+    def setUp(self):
+        clear_caches()
+        self.admin = User.objects.create_user(username="ngo_admin", password="password123")
+        self.ngo = create_ngo(self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_transactions(self, count):
+        add_transactions(self.ngo, count)
+
+
+class ConstantQueriesMixin:
+    """For NGOTestCase classes asserting that a ledger endpoint runs a fixed number of queries."""
+
+    def assertConstantQueries(self, url, num_queries, sizes=(1, 20)):
+        """Request url at several ledger sizes and check it takes num_queries queries every time."""
+        for size in sizes:
+            self.add_transactions(size)
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return response
@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps as installed_apps
+from django.db import IntegrityError, connection, models, transaction as db_transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Trunc
+from django.utils import timezone
+
+from .models import NGOActivityRollup, NGOLedgerSummary
+
+ZERO = Value(Decimal("0"), output_field=models.DecimalField(max_digits=16, decimal_places=2))
+ROLLUP_BUCKETS = [bucket for bucket, _ in NGOActivityRollup.BUCKETS]
+
+
+def period_start(timestamp, bucket):
+    """Start of the day, ISO week (Monday) or month containing timestamp, in the current time zone."""
+    day = timezone.localtime(timestamp).date()
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _new_delta():
+    return {"donated": Decimal("0"), "spent": Decimal("0"), "donations": 0, "expenses": 0, "last_activity": None}
+
+
+def _add_to_delta(delta, tx, sign=1):
+    amount = Decimal(str(tx.amount)) * sign
+    if tx.transaction_type == "donation":
+        delta["donated"] += amount
+        delta["donations"] += sign
+    else:
+        delta["spent"] += amount
+        delta["expenses"] += sign
+    # Taking rows out leaves last_activity alone; only a rebuild can find the previous latest row
+    if sign > 0 and (delta["last_activity"] is None or tx.timestamp > delta["last_activity"]):
+        delta["last_activity"] = tx.timestamp
+
+
+def _add_or_create(model, lookup, changes, initial):
+    """
+    Apply F() changes to the row matching lookup, creating it with initial values if it is missing.
+    A single UPDATE per row means concurrent inserts never read-modify-write the same totals.
+    """
+    if model.objects.filter(**lookup).update(**changes):
+        return
+
+    # First row for this key; if another insert creates it first, add to that one instead
+    try:
+        with db_transaction.atomic():
+            model.objects.create(**lookup, **initial)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**changes)
+
+
+def update_ledger_summaries(transactions, sign=1):
+    """
+    Add freshly inserted ledger rows to their NGOs' summaries, or take rows that failed out of them
+    with sign=-1. Call it inside the DB transaction that inserted or failed the rows.
+    """
+    deltas = defaultdict(_new_delta)
+    for tx in transactions:
+        _add_to_delta(deltas[tx.ngo_id], tx, sign)
+
+    for ngo_id, delta in deltas.items():
+        changes = {
+            "total_donated": F("total_donated") + delta["donated"],
+            "total_spent": F("total_spent") + delta["spent"],
+            "balance": F("balance") + delta["donated"] - delta["spent"],
+            "donation_count": F("donation_count") + delta["donations"],
+            "expense_count": F("expense_count") + delta["expenses"],
+        }
+        if delta["last_activity"] is not None:
+            last_activity = Value(delta["last_activity"])
+            changes["last_activity"] = Greatest(Coalesce("last_activity", last_activity), last_activity)
+        _add_or_create(
+            NGOLedgerSummary,
+            {"ngo_id": ngo_id},
+            changes,
+            {
+                "total_donated": delta["donated"],
+                "total_spent": delta["spent"],
+                "balance": delta["donated"] - delta["spent"],
+                "donation_count": delta["donations"],
+                "expense_count": delta["expenses"],
+                "last_activity": delta["last_activity"],
+            },
+        )
+
+
+def update_activity_rollups(transactions, sign=1):
+    """Add ledger rows to their day, week and month rollups, or take them out with sign=-1, as for the summaries."""
+    deltas = defaultdict(_new_delta)
+    for tx in transactions:
+        for bucket in ROLLUP_BUCKETS:
+            _add_to_delta(deltas[(tx.ngo_id, bucket, period_start(tx.timestamp, bucket))], tx, sign)
+
+    for (ngo_id, bucket, start), delta in deltas.items():
+        _add_or_create(
+            NGOActivityRollup,
+            {"ngo_id": ngo_id, "bucket": bucket, "period_start": start},
+            {
+                "donated": F("donated") + delta["donated"],
+                "spent": F("spent") + delta["spent"],
+                "donation_count": F("donation_count") + delta["donations"],
+                "expense_count": F("expense_count") + delta["expenses"],
+            },
+            {
+                "donated": delta["donated"],
+                "spent": delta["spent"],
+                "donation_count": delta["donations"],
+                "expense_count": delta["expenses"],
+            },
+        )
+
+
+def update_aggregates(transactions, sign=1):
+    update_ledger_summaries(transactions, sign)
+    update_activity_rollups(transactions, sign)
+
+
+def _totals(queryset):
+    return queryset.annotate(
+        donated=Coalesce(Sum("amount", filter=Q(transaction_type="donation")), ZERO),
+        spent=Coalesce(Sum("amount", filter=Q(transaction_type="expense")), ZERO),
+        donation_count=Count("id", filter=Q(transaction_type="donation")),
+        expense_count=Count("id", filter=Q(transaction_type="expense")),
+    )
+
+
+def _lock_for_rebuild(model):
+    """
+    Block ledger inserts from touching model's rows until the rebuild commits. Inserts already under
+    way finish first, so the totals read after this include them; the ones that follow add to the
+    rebuilt rows. Other databases serialise writers anyway.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def rebuild_ledger_summaries(apps=installed_apps):
+    """
+    Recompute every NGO summary from the ledger rows. Returns the number of NGOs summarised.
+    Migrations pass their own apps, so the backfill runs against the models as they were then.
+    """
+    Transaction = apps.get_model("transactions", "Transaction")
+    NGOLedgerSummary = apps.get_model("transactions", "NGOLedgerSummary")
+
+    with db_transaction.atomic():
+        _lock_for_rebuild(NGOLedgerSummary)
+        totals = _totals(Transaction.objects.exclude(status="failed").order_by().values("ngo_id"))
+        totals = totals.annotate(last_activity=Max("timestamp"))
+        summaries = [
+            NGOLedgerSummary(
+                ngo_id=row["ngo_id"],
+                total_donated=row["donated"],
+                total_spent=row["spent"],
+                balance=row["donated"] - row["spent"],
+                donation_count=row["donation_count"],
+                expense_count=row["expense_count"],
+                last_activity=row["last_activity"],
+            )
+            for row in totals
+        ]
+        NGOLedgerSummary.objects.all().delete()
+        NGOLedgerSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+def rebuild_activity_rollups(batch_size=5000, apps=installed_apps):
+    """
+    Recompute every rollup from the ledger rows, grouping in the database. Returns the number of rollup rows.
+    Migrations pass their own apps, as for rebuild_ledger_summaries.
+    """
+    Transaction = apps.get_model("transactions", "Transaction")
+    NGOActivityRollup = apps.get_model("transactions", "NGOActivityRollup")
+
+    count = 0
+    with db_transaction.atomic():
+        _lock_for_rebuild(NGOActivityRollup)
+        NGOActivityRollup.objects.all().delete()
+        for bucket in ROLLUP_BUCKETS:
+            totals = _totals(
+                Transaction.objects.exclude(status="failed")
+                .order_by()
+                .annotate(period_start=Trunc("timestamp", bucket, output_field=models.DateField()))
+                .values("ngo_id", "period_start")
+            )
+            rollups = (NGOActivityRollup(bucket=bucket, **row) for row in totals.iterator(chunk_size=batch_size))
+            count += len(NGOActivityRollup.objects.bulk_create(rollups, batch_size=batch_size))
+    return count
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ngos.cache import invalidate_ngos
+from ngos.utils import create_blockchain_record
+from .merkle import build_merkle_tree
+from .models import AnchorBatch, Transaction
+from .payload import encode_anchor
+
+
+def anchoring_enabled():
+    return settings.BLOCKCHAIN_ANCHOR_MODE == "batch"
+
+
+def release_stale_claims():
+    """
+    Hand rows back from batches whose chain write never got a hash within CHAIN_WRITE_CLAIM_TIMEOUT
+    seconds, because the write failed or the process anchoring them died. Returns the number of rows.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CHAIN_WRITE_CLAIM_TIMEOUT)
+    stale = AnchorBatch.objects.filter(blockchain_hash="", created_at__lt=cutoff)
+    return Transaction.objects.filter(anchor__in=stale, blockchain_hash="").update(anchor=None, merkle_proof=[])
+
+
+def anchor_pending_transactions(batch_size=None, **filters):
+    """
+    Anchor up to batch_size rows that only have a leaf hash under a single Merkle root.
+    Every row in the batch gets the root's blockchain hash and its own inclusion proof.
+    Extra filters narrow down which pending rows are considered.
+
+    The rows are claimed for a new AnchorBatch in one short DB transaction, which takes them out
+    of the pending set. The chain write is sent with no lock held, and a second transaction gives
+    the rows its hash. If the write fails, the rows are handed back for the next batch. The batch
+    row stays without a hash as a record of the attempt.
+    Returns the AnchorBatch, or None if there was nothing to anchor or the chain write failed.
+    """
+    batch_size = batch_size or settings.BLOCKCHAIN_ANCHOR_BATCH_SIZE
+    release_stale_claims()
+
+    with transaction.atomic():
+        # skip_locked lets several batchers run side by side without anchoring a row twice; only the
+        # ledger rows are locked, PostgreSQL cannot lock the outer-joined outbox side
+        pending = list(
+            Transaction.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(anchor__isnull=True, blockchain_hash="", leaf_hash__isnull=False, chain_write__isnull=True)
+            .exclude(status="failed")
+            .filter(**filters)
+            .order_by("id")
+            .only("id", "ngo_id", "leaf_hash")[:batch_size]
+        )
+        if not pending:
+            return None
+
+        merkle_root, proofs = build_merkle_tree([tx.leaf_hash for tx in pending])
+        # The payload carries the batch id, so the batch is created before the write
+        batch = AnchorBatch.objects.create(merkle_root=merkle_root, leaf_count=len(pending))
+        for tx, proof in zip(pending, proofs):
+            tx.anchor = batch
+            tx.merkle_proof = proof
+        Transaction.objects.bulk_update(pending, ["anchor", "merkle_proof"])
+
+    transaction_hash = create_blockchain_record(encode_anchor(batch))
+
+    with transaction.atomic():
+        claimed = Transaction.objects.filter(anchor=batch, blockchain_hash="")
+        if not transaction_hash:
+            claimed.update(anchor=None, merkle_proof=[])
+            return None
+
+        batch.blockchain_hash = transaction_hash
+        batch.save(update_fields=["blockchain_hash"])
+        claimed.update(blockchain_hash=transaction_hash, sent_at=timezone.now())
+        ngo_ids = {tx.ngo_id for tx in pending}
+        transaction.on_commit(lambda: invalidate_ngos(ngo_ids))
+
+    return batch
@@ -0,0 +1,34 @@
+from django.http import JsonResponse
+
+from ngos.async_views import AsyncAPIView
+from .payments import averify_payment, get_gateway, order_response, payment_response
+from .views import CreateOrderView, PaymentVerificationView
+
+
+class AsyncCreateOrderView(AsyncAPIView):
+    sync_view = CreateOrderView
+
+    async def post(self, request, ngo_id):
+        try:
+            order = await get_gateway().acreate_order(request.data.get("amount"), ngo_id, request.user.id)
+            return JsonResponse(order_response(order))
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+
+class AsyncPaymentVerificationView(AsyncAPIView):
+    sync_view = PaymentVerificationView
+
+    async def post(self, request):
+        try:
+            payment_id = request.data.get("razorpay_payment_id")
+            order_id = request.data.get("razorpay_order_id")
+            signature = request.data.get("razorpay_signature")
+
+            transaction, created = await averify_payment(payment_id, order_id, signature)
+            return JsonResponse(payment_response(transaction), status=202 if created else 200)
+
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({"error": "Payment verification failed: " + str(e)}, status=400)
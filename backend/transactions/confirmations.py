@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Min
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ngos.utils import get_transaction_receipts
+from .ledger import transactions_failed
+from .models import Transaction
+
+
+def track_confirmations(batch_size=500):
+    """
+    Poll receipts for sent chain writes that are not final yet and record where they were mined.
+
+    The batch_size oldest outstanding hashes are fetched in one batched JSON-RPC request. Rows
+    sharing a hash (a Merkle batch) are updated together and become "completed" once their write
+    is BLOCKCHAIN_CONFIRMATIONS blocks deep. Rows whose write reverted, or still has no receipt
+    BLOCKCHAIN_RECEIPT_TIMEOUT seconds after it was sent, are marked failed, except rows of a
+    Merkle batch, which are anchored again (see _fail). Returns the number of hashes that have a
+    receipt.
+    """
+    outstanding = list(
+        Transaction.objects.filter(status="pending")
+        .exclude(blockchain_hash="")
+        .values("blockchain_hash")
+        # Rows written before sent_at existed were sent when they were recorded
+        .annotate(sent_at=Min(Coalesce("sent_at", "timestamp")))
+        .order_by("sent_at", "blockchain_hash")[:batch_size]
+    )
+    if not outstanding:
+        return 0
+
+    head, receipts = get_transaction_receipts([row["blockchain_hash"] for row in outstanding])
+    give_up_before = timezone.now() - timedelta(seconds=settings.BLOCKCHAIN_RECEIPT_TIMEOUT)
+
+    mined = 0
+    failed = []
+    for row in outstanding:
+        tx_hash = row["blockchain_hash"]
+        receipt = receipts.get(tx_hash)
+        if not receipt or not receipt.get("blockNumber"):
+            # Dropped by the node, or never broadcast
+            if row["sent_at"] < give_up_before:
+                failed.append(tx_hash)
+            continue
+        mined += 1
+
+        block_number = int(receipt["blockNumber"], 16)
+        fields = {
+            "block_number": block_number,
+            "gas_used": int(receipt["gasUsed"], 16),
+            "confirmations": max(head - block_number + 1, 0),
+        }
+        # A reverted transaction was mined but did not do what the ledger says it did
+        if receipt.get("status") == "0x0":
+            failed.append(tx_hash)
+        elif fields["confirmations"] >= settings.BLOCKCHAIN_CONFIRMATIONS:
+            fields["status"] = "completed"
+        Transaction.objects.filter(blockchain_hash=tx_hash, status="pending").update(**fields)
+
+    if failed:
+        _fail(failed)
+    return mined
+
+
+def _fail(transaction_hashes):
+    """
+    Deal with the rows of writes that were dropped or reverted. A row written on its own is marked
+    failed and taken out of the aggregates. A row under a Merkle root stands for a payment or
+    expense that still happened; only the root write failed. It is detached from its batch and
+    stays pending, so the next anchor_pending_transactions run anchors it under a new root.
+    The AnchorBatch is kept as a record of the failed attempt.
+    """
+    with db_transaction.atomic():
+        rows = list(
+            Transaction.objects.select_for_update()
+            .filter(blockchain_hash__in=transaction_hashes, status="pending")
+            .only("id", "ngo_id", "transaction_type", "amount", "timestamp", "anchor_id")
+        )
+        anchored = [row.id for row in rows if row.anchor_id]
+        Transaction.objects.filter(id__in=anchored).update(
+            anchor=None,
+            merkle_proof=[],
+            blockchain_hash="",
+            sent_at=None,
+            block_number=None,
+            gas_used=None,
+            confirmations=0,
+        )
+
+        failed = [row for row in rows if not row.anchor_id]
+        Transaction.objects.filter(id__in=[row.id for row in failed]).update(status="failed")
+        transactions_failed(failed)
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import math
+import random
+import time
+from bisect import bisect
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction as db_transaction
+from django.utils import timezone
+
+from ngos.cache import invalidate_ngos
+from ngos.models import NGO
+from .aggregates import rebuild_activity_rollups, rebuild_ledger_summaries
+from .anchoring import anchor_pending_transactions
+from .merkle import leaf_hash
+from .models import Transaction
+
+# Share of activity per hour of the day (UTC), quiet at night and busiest in the evening
+HOURLY_PROFILE = [1, 1, 1, 1, 1, 2, 3, 5, 6, 7, 7, 7, 7, 7, 6, 6, 7, 8, 10, 11, 10, 7, 4, 2]
+# Monday first; weekends see more donations
+WEEKLY_PROFILE = [1.0, 0.9, 0.9, 0.95, 1.0, 1.3, 1.4]
+
+# Log-normal amounts in rupees: (median, sigma), clipped to what the amount column holds
+AMOUNTS = {"donation": (500, 1.1), "expense": (8000, 1.0)}
+MIN_AMOUNT, MAX_AMOUNT = 10, 5_000_000
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative Zipf weights for ranks 1..count, for random.choices(cum_weights=...)."""
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def hourly_intensity(days, bursts, rng, end=None):
+    """
+    Relative activity for every hour of a days long window ending at end (now by default), oldest first.
+
+    The base rate follows the daily and weekly profiles and grows over the window, and on top
+    of it sit bursts (campaigns, appeals after a disaster) that multiply the rate for a few hours
+    to a few days and then decay.
+    """
+    hours = days * 24
+    end = (end or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(hours=hours)
+    intensity = []
+    for hour in range(hours):
+        moment = start + timedelta(hours=hour)
+        growth = 0.5 + hour / hours
+        intensity.append(HOURLY_PROFILE[moment.hour] * WEEKLY_PROFILE[moment.weekday()] * growth)
+
+    for _ in range(bursts):
+        peak = rng.randrange(hours)
+        strength = rng.uniform(5, 40)
+        decay = rng.uniform(3, 72)  # hours for the burst to fall to 1/e
+        for hour in range(peak, min(hours, peak + int(decay * 6))):
+            intensity[hour] *= 1 + strength * math.exp(-(hour - peak) / decay)
+    return start, intensity
+
+
+def bursty_timestamps(count, days, bursts, rng, end=None):
+    """Yield count timestamps in ascending order, spread over the days before end by hourly_intensity()."""
+    start, intensity = hourly_intensity(days, bursts, rng, end)
+    scale = count / sum(intensity)
+    expected = 0.0
+    emitted = 0
+    for hour, weight in enumerate(intensity):
+        expected += weight * scale
+        # The last hour takes the rounding remainder so exactly count timestamps come out
+        in_hour = count - emitted if hour == len(intensity) - 1 else int(expected) - emitted
+        for seconds in sorted(rng.random() * 3600 for _ in range(in_hour)):
+            yield start + timedelta(hours=hour, seconds=seconds)
+        emitted += in_hour
+
+
+def skewed_amount(transaction_type, rng):
+    median, sigma = AMOUNTS[transaction_type]
+    amount = min(max(rng.lognormvariate(math.log(median), sigma), MIN_AMOUNT), MAX_AMOUNT)
+    # People give round sums more often than not
+    if transaction_type == "donation" and rng.random() < 0.6:
+        amount = max(MIN_AMOUNT, round(amount, -2 if amount >= 1000 else -1))
+    return Decimal(str(round(amount, 2))).quantize(Decimal("0.01"))
+
+
+def copy_rows(objects):
+    """Insert Transaction objects with PostgreSQL COPY, several times faster than INSERT for large batches."""
+    fields = [field for field in Transaction._meta.concrete_fields if not field.primary_key]
+    # Unquoted empty CSV values are NULL, so non-null text columns are read as empty strings instead
+    not_null = [field.column for field in fields if not field.null and isinstance(field, models.CharField)]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        row = []
+        for field in fields:
+            value = getattr(obj, field.attname)
+            row.append(json.dumps(value) if isinstance(field, models.JSONField) else value)
+        writer.writerow(row)
+    buffer.seek(0)
+
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    force_not_null = ", ".join(connection.ops.quote_name(column) for column in not_null)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(Transaction._meta.db_table)} ({columns}) "
+            f"FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({force_not_null}))",
+            buffer,
+        )
+
+
+def insert_rows(objects):
+    if connection.vendor == "postgresql":
+        copy_rows(objects)
+    else:
+        Transaction.objects.bulk_create(objects)
+
+
+def generate_ledger(
+    users,
+    ngos,
+    transactions,
+    prefix="synthetic",
+    days=365,
+    end=None,
+    expense_ratio=0.2,
+    ngo_skew=1.1,
+    donor_skew=0.8,
+    bursts=25,
+    batch_size=10000,
+    deferred_hash=False,
+    password=None,
+    seed=None,
+    report=None,
+):
+    """
+    Bulk insert a synthetic ledger: users donor accounts, ngos NGOs (each with its own admin)
+    and transactions ledger rows.
+
+    NGOs and donors are picked with Zipf popularity, amounts are log-normal and timestamps
+    follow hourly_intensity() over the days before end (now if not given). Rows are inserted in
+    ascending time order, batch_size at a time (COPY on PostgreSQL), with their leaf hashes. With
+    deferred_hash nothing touches the chain and the rows wait for anchor_transactions; otherwise
+    each batch is anchored under Merkle roots as it is inserted. The same seed and end produce the
+    same ledger. report(inserted, elapsed) is called after every batch. Returns the number of rows
+    anchored.
+    """
+    rng = random.Random(seed)
+    if User.objects.filter(username__startswith=f"{prefix}_").exists():
+        raise ValueError(f"Users named {prefix}_* already exist, pick another prefix")
+
+    # Hashing is slow on purpose, so every generated account shares one hash
+    password = make_password(password)
+    admins = User.objects.bulk_create(
+        (User(username=f"{prefix}_admin_{i}", password=password) for i in range(ngos)), batch_size=batch_size
+    )
+    donors = User.objects.bulk_create(
+        (User(username=f"{prefix}_donor_{i}", password=password) for i in range(users)), batch_size=batch_size
+    )
+    created_ngos = NGO.objects.bulk_create(
+        (
+            NGO(
+                name=f"{prefix.title()} NGO {i}",
+                logo_url=f"https://example.com/{prefix}/logos/{i}.png",
+                certificate_url=f"https://example.com/{prefix}/certificates/{i}",
+                admin=admin,
+                description=f"Generated NGO {i}",
+            )
+            for i, admin in enumerate(admins)
+        ),
+        batch_size=batch_size,
+    )
+
+    # Popularity rank -> id, shuffled so the busiest NGOs and donors are not simply the first ones
+    ngo_ids = [ngo.id for ngo in created_ngos]
+    donor_ids = [donor.id for donor in donors]
+    rng.shuffle(ngo_ids)
+    rng.shuffle(donor_ids)
+    ngo_weights = zipf_cum_weights(len(ngo_ids), ngo_skew)
+    donor_weights = zipf_cum_weights(len(donor_ids), donor_skew)
+    admin_of = {ngo.id: ngo.admin_id for ngo in created_ngos}
+
+    first_id = Transaction.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    timestamps = bursty_timestamps(transactions, days, bursts, rng, end)
+    inserted = anchored = 0
+    started = time.monotonic()
+    while inserted < transactions:
+        rows = []
+        for timestamp in (next(timestamps) for _ in range(min(batch_size, transactions - inserted))):
+            ngo_id = ngo_ids[bisect(ngo_weights, rng.random() * ngo_weights[-1])]
+            row = Transaction(ngo_id=ngo_id, timestamp=timestamp, blockchain_hash="", status="pending")
+            if rng.random() < expense_ratio:
+                # Expenses are filed by the NGO's admin
+                row.user_id = admin_of[ngo_id]
+                row.transaction_type = "expense"
+                row.proof_url = f"https://example.com/{prefix}/proofs/{inserted + len(rows)}.pdf"
+                row.description = rng.choice(["Supplies", "Field work", "Salaries", "Transport", "Venue hire"])
+            else:
+                row.user_id = donor_ids[bisect(donor_weights, rng.random() * donor_weights[-1])]
+                row.transaction_type = "donation"
+                row.razorpay_order_id = f"order_{prefix}_{inserted + len(rows)}"
+                row.razorpay_payment_id = f"pay_{prefix}_{inserted + len(rows)}"
+            row.amount = skewed_amount(row.transaction_type, rng)
+            row.leaf_hash = leaf_hash(
+                row.ngo_id,
+                row.user_id,
+                row.transaction_type,
+                row.amount,
+                row.proof_url,
+                row.description,
+                row.razorpay_payment_id,
+            )
+            rows.append(row)
+
+        with db_transaction.atomic():
+            insert_rows(rows)
+        inserted += len(rows)
+
+        if not deferred_hash:
+            while batch := anchor_pending_transactions(id__gt=first_id):
+                anchored += batch.leaf_count
+        if report:
+            report(inserted, time.monotonic() - started)
+
+    # Rows went in without the per-insert bookkeeping, so the aggregates are rebuilt in the database
+    rebuild_ledger_summaries()
+    rebuild_activity_rollups()
+    invalidate_ngos(ngo_ids, listing=True)
+    return anchored
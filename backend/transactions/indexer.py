@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import transaction
+
+from ngos.utils import ACCOUNT_ADDRESS, get_block_number, get_blocks
+from .models import ChainLedgerRecord, IndexedBlock, LedgerCheckpoint
+from .payload import decode_records
+
+CHECKPOINT_NAME = "index_chain"
+RECORD_FIELDS = ["block_number", "block_hash", "kind", "ngo_id", "amount", "leaf_count", "record_id", "content_hash"]
+
+
+def bare_hash(value):
+    """Transaction and block hashes are stored without 0x, like Transaction.blockchain_hash, so they can be joined."""
+    return value.removeprefix("0x")
+
+
+def rewind_to(block_number):
+    """Forget everything indexed from block_number on, so indexing restarts there."""
+    with transaction.atomic():
+        ChainLedgerRecord.objects.filter(block_number__gte=block_number).delete()
+        IndexedBlock.objects.filter(number__gte=block_number).delete()
+        LedgerCheckpoint.objects.update_or_create(name=CHECKPOINT_NAME, defaults={"position": max(block_number - 1, 0)})
+
+
+def rewind_reorged_blocks():
+    """
+    Compare the hashes of the last BLOCKCHAIN_CONFIRMATIONS indexed blocks with the chain.
+    If a block was replaced, everything from the oldest replaced block on is rolled back.
+    Returns the block indexing restarts from, or None if there was no reorg.
+    """
+    recent = list(IndexedBlock.objects.order_by("-number")[: settings.BLOCKCHAIN_CONFIRMATIONS])
+    if not recent:
+        return None
+
+    fork = None
+    for stored, block in zip(recent, get_blocks([stored.number for stored in recent])):
+        if block and bare_hash(block["hash"]) == stored.hash:
+            break
+        fork = stored.number
+    if fork is not None:
+        rewind_to(fork)
+    return fork
+
+
+def _ledger_records(blocks):
+    """Decode the ledger records in a list of full blocks; only writes sent by our account count."""
+    candidates = [
+        (block, tx)
+        for block in blocks
+        for tx in block["transactions"]
+        if tx["from"].lower() == ACCOUNT_ADDRESS.lower() and (tx.get("to") or "").lower() == ACCOUNT_ADDRESS.lower()
+    ]
+    decoded = decode_records([tx["input"] for _, tx in candidates])
+
+    records = []
+    for (block, tx), record in zip(candidates, decoded):
+        if record is None:
+            continue
+        is_root = record.kind == "merkle_root"
+        records.append(
+            ChainLedgerRecord(
+                transaction_hash=bare_hash(tx["hash"]),
+                block_number=int(block["number"], 16),
+                block_hash=bare_hash(block["hash"]),
+                kind=record.kind,
+                ngo_id=record.ngo_id,
+                amount=0 if is_root else record.amount,
+                leaf_count=record.amount if is_root else None,
+                record_id=record.record_id,
+                content_hash=record.content_hash,
+            )
+        )
+    return records
+
+
+def index_chain(max_blocks=2000, batch_size=100):
+    """
+    Index up to max_blocks blocks past the checkpoint, fetching batch_size blocks per JSON-RPC request.
+
+    Ledger records are upserted by transaction hash and the checkpoint advances in the same DB
+    transaction, so an interrupted run resumes cleanly. Reorgs within the last
+    BLOCKCHAIN_CONFIRMATIONS blocks are rolled back first. Returns (blocks indexed, records found).
+    """
+    rewind_reorged_blocks()
+    checkpoint, _ = LedgerCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    start = checkpoint.position + 1
+    end = min(get_block_number(), start + max_blocks - 1)
+    if start > end:
+        return 0, 0
+
+    blocks = []
+    for first in range(start, end + 1, batch_size):
+        blocks += get_blocks(range(first, min(first + batch_size, end + 1)), full_transactions=True)
+    # Stop before a block the node could not return, it is picked up on the next run
+    if None in blocks:
+        blocks = blocks[: blocks.index(None)]
+        if not blocks:
+            return 0, 0
+        end = start + len(blocks) - 1
+
+    records = _ledger_records(blocks)
+    keep_from = end - settings.BLOCKCHAIN_CONFIRMATIONS + 1
+    with transaction.atomic():
+        ChainLedgerRecord.objects.bulk_create(
+            records, update_conflicts=True, unique_fields=["transaction_hash"], update_fields=RECORD_FIELDS
+        )
+        IndexedBlock.objects.bulk_create(
+            [
+                IndexedBlock(number=int(block["number"], 16), hash=bare_hash(block["hash"]))
+                for block in blocks
+                if int(block["number"], 16) >= keep_from
+            ],
+            update_conflicts=True,
+            unique_fields=["number"],
+            update_fields=["hash"],
+        )
+        IndexedBlock.objects.filter(number__lt=keep_from).delete()
+        checkpoint.position = end
+        checkpoint.save(update_fields=["position", "updated_at"])
+
+    return len(blocks), len(records)
@@ -0,0 +1,194 @@
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+
+from ngos.cache import invalidate_ngos
+from ngos.utils import acreate_blockchain_record, create_blockchain_record
+from .aggregates import update_aggregates
+from .anchoring import anchor_pending_transactions, anchoring_enabled
+from .merkle import build_merkle_tree
+from .models import AnchorBatch, ChainWrite, Transaction
+from .payload import encode_anchor, encode_transaction
+
+
+def transactions_inserted(transactions):
+    """Bookkeeping for new ledger rows; call it inside the DB transaction that inserted them."""
+    update_aggregates(transactions)
+    ngo_ids = {tx.ngo_id for tx in transactions}
+    db_transaction.on_commit(lambda: invalidate_ngos(ngo_ids))
+
+
+def transactions_failed(transactions):
+    """Take counted ledger rows whose chain write failed out of the aggregates; call it where they are marked failed."""
+    update_aggregates(transactions, sign=-1)
+    ngo_ids = {tx.ngo_id for tx in transactions}
+    db_transaction.on_commit(lambda: invalidate_ngos(ngo_ids))
+
+
+def reserve_transaction_id(transaction):
+    """
+    Draw the id transaction will be inserted with, without inserting anything readers could see.
+    On PostgreSQL that is the next value of the id sequence. Other databases have no sequence to
+    draw from, so a placeholder row is inserted and deleted in one DB transaction; the table's
+    AUTOINCREMENT never hands the id out again.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [Transaction._meta.db_table])
+            return cursor.fetchone()[0]
+
+    with db_transaction.atomic():
+        placeholder = Transaction.objects.create(
+            ngo_id=transaction.ngo_id,
+            user_id=transaction.user_id,
+            transaction_type=transaction.transaction_type,
+            amount=0,
+            leaf_hash=transaction.leaf_hash,
+            status="failed",
+        )
+        reserved_id = placeholder.id
+        placeholder.delete()
+    return reserved_id
+
+
+def record_transaction(**fields):
+    """
+    Save a ledger row and put it on the blockchain.
+
+    In direct mode the row gets its own blockchain transaction carrying its encoded payload.
+    The payload includes the row id, so the id is reserved first and the row is inserted, and
+    counted in the aggregates, only after the chain write. A failed write is kept as a row with
+    status "failed", which the ledger views and aggregates leave out. In batch mode the row is
+    saved as pending with just its leaf hash, and anchor_transactions later writes the Merkle
+    root of a whole batch. Returns the Transaction, or None if the chain write failed.
+    """
+    transaction = Transaction(**fields)
+    transaction.leaf_hash = transaction.compute_leaf_hash()
+
+    if not anchoring_enabled():
+        # No lock is held while waiting for the node
+        transaction.id = reserve_transaction_id(transaction)
+        transaction.blockchain_hash = create_blockchain_record(encode_transaction(transaction))
+        if not transaction.blockchain_hash:
+            _save_failed(transaction)
+            return None
+        transaction.sent_at = timezone.now()
+
+    _save_recorded(transaction)
+    return transaction
+
+
+async def arecord_transaction(**fields):
+    """Async record_transaction for async views: the chain write is awaited instead of blocking a thread."""
+    transaction = Transaction(**fields)
+    transaction.leaf_hash = transaction.compute_leaf_hash()
+
+    if not anchoring_enabled():
+        transaction.id = await sync_to_async(reserve_transaction_id)(transaction)
+        transaction.blockchain_hash = await acreate_blockchain_record(encode_transaction(transaction))
+        if not transaction.blockchain_hash:
+            await sync_to_async(_save_failed)(transaction)
+            return None
+        transaction.sent_at = timezone.now()
+
+    await sync_to_async(_save_recorded)(transaction)
+    return transaction
+
+
+def record_transactions(transactions):
+    """
+    Save several ledger rows with one bulk insert and anchor them under a single Merkle root,
+    so the whole list costs one chain write instead of one per row.
+
+    In direct mode the chain write comes first, as with record_transaction. The root only covers
+    the rows' leaf hashes, so the AnchorBatch is created and its root sent before the rows exist.
+    Then the rows are inserted with their proofs and counted in one DB transaction. If the write
+    failed they are kept as failed instead and the batch that was never written is deleted. In
+    batch mode the rows are inserted as pending and anchored right away; if that fails they stay
+    pending for anchor_transactions. The Transaction objects are updated in place with their ids,
+    hashes and status. Returns the AnchorBatch, or None if the chain write failed.
+    """
+    for transaction in transactions:
+        transaction.leaf_hash = transaction.compute_leaf_hash()
+        transaction.blockchain_hash = ""
+        transaction.status = "pending"
+
+    if anchoring_enabled():
+        return _record_pending(transactions)
+
+    merkle_root, proofs = build_merkle_tree([transaction.leaf_hash for transaction in transactions])
+    batch = AnchorBatch.objects.create(merkle_root=merkle_root, leaf_count=len(transactions))
+    transaction_hash = create_blockchain_record(encode_anchor(batch))
+    sent_at = timezone.now()
+
+    with db_transaction.atomic():
+        if transaction_hash:
+            batch.blockchain_hash = transaction_hash
+            batch.save(update_fields=["blockchain_hash"])
+        else:
+            # Its id went out in a payload that never made it on chain, so nothing refers to it
+            batch.delete()
+        for transaction, proof in zip(transactions, proofs):
+            if transaction_hash:
+                transaction.anchor = batch
+                transaction.merkle_proof = proof
+                transaction.blockchain_hash = transaction_hash
+                transaction.sent_at = sent_at
+            else:
+                transaction.status = "failed"
+        Transaction.objects.bulk_create(transactions)
+        if transaction_hash:
+            transactions_inserted(transactions)
+    return batch if transaction_hash else None
+
+
+def _record_pending(transactions):
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(transactions)
+        transactions_inserted(transactions)
+    ids = [transaction.id for transaction in transactions]
+
+    batch = anchor_pending_transactions(batch_size=len(transactions), id__in=ids)
+    if batch is None:
+        return None
+
+    # An anchor_transactions run may have taken some of the rows first, so each row's own anchor is read back
+    anchored = Transaction.objects.only("anchor", "blockchain_hash", "sent_at").in_bulk(ids)
+    for transaction in transactions:
+        row = anchored[transaction.id]
+        transaction.anchor_id = row.anchor_id
+        transaction.blockchain_hash = row.blockchain_hash
+        transaction.sent_at = row.sent_at
+    return batch
+
+
+def _save_recorded(transaction):
+    with db_transaction.atomic():
+        transaction.save(force_insert=True)
+        transactions_inserted([transaction])
+
+
+def _save_failed(transaction):
+    transaction.blockchain_hash = ""
+    transaction.status = "failed"
+    transaction.save(force_insert=True)
+
+
+def queue_transaction(idempotency_key, **fields):
+    """
+    Save a ledger row as pending without waiting for the blockchain.
+
+    In direct mode the chain write goes into the ChainWrite outbox for process_chain_writes,
+    keyed on idempotency_key. In batch mode the row is already waiting for anchor_transactions.
+    """
+    if anchoring_enabled():
+        return record_transaction(**fields)
+
+    with db_transaction.atomic():
+        transaction = Transaction(**fields)
+        transaction.leaf_hash = transaction.compute_leaf_hash()
+        transaction.status = "pending"
+        transaction.save()
+        transactions_inserted([transaction])
+        ChainWrite.objects.create(transaction=transaction, idempotency_key=idempotency_key)
+    return transaction
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.anchoring import anchor_pending_transactions
+
+
+class Command(BaseCommand):
+    help = "Anchor pending transactions on the blockchain in Merkle batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Maximum transactions per Merkle root")
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between runs; 0 anchors what is pending once and exits"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # Drain everything that is pending before sleeping
+            while batch := anchor_pending_transactions(options["batch_size"]):
+                self.stdout.write(f"Anchored {batch.leaf_count} transactions under {batch.merkle_root}")
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
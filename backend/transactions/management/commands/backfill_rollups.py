@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from transactions.aggregates import rebuild_activity_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily, weekly and monthly NGO activity rollups from the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rollup rows inserted per query")
+
+    def handle(self, *args, **options):
+        count = rebuild_activity_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {count} rollup rows"))
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ngos.models import NGO
+
+
+class Command(BaseCommand):
+    help = "Call each ledger endpoint and EXPLAIN ANALYZE the queries it runs (run it against seeded data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ngo", type=int, help="NGO id to query (defaults to the first NGO)")
+        parser.add_argument("--user", type=int, help="User id for the user filter (defaults to the first user)")
+
+    def handle(self, *args, **options):
+        ngo = NGO.objects.filter(id=options["ngo"]).first() if options["ngo"] else NGO.objects.first()
+        user = User.objects.filter(id=options["user"]).first() if options["user"] else User.objects.first()
+        if not ngo or not user:
+            raise CommandError("No NGO or user found, seed the database first")
+
+        endpoints = {
+            "transaction list": reverse("transaction_list"),
+            "transaction list by user and amount": reverse("transaction_list")
+            + f"?user_id={user.id}&min_amount=100&max_amount=1000",
+            "ngo detail": reverse("ngo_detail", args=[ngo.id]),
+            "incoming transactions": reverse("incoming_transactions", args=[ngo.id]),
+            "outgoing transactions": reverse("outgoing_transactions", args=[ngo.id]),
+        }
+
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for name, url in endpoints.items():
+            # Capture exactly the SQL the endpoint runs instead of rebuilding its querysets here
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}: {url}"))
+            for query in queries.captured_queries:
+                if "transactions_transaction" not in query["sql"]:
+                    continue
+                self.stdout.write(query["sql"])
+                for line in self.explain(query["sql"]):
+                    style = self.style.SUCCESS if "Index" in line or "INDEX" in line else str
+                    self.stdout.write("    " + style(line))
+            self.stdout.write("")
+
+    def explain(self, sql):
+        prefix = "EXPLAIN ANALYZE " if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from transactions.generator import generate_ledger
+
+
+class Command(BaseCommand):
+    help = "Bulk insert a synthetic ledger with realistic NGO popularity, amounts and timing for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="Donor accounts to create")
+        parser.add_argument("--ngos", type=int, default=100, help="NGOs to create, each with an admin account")
+        parser.add_argument("--transactions", type=int, default=100000, help="Ledger rows to create")
+        parser.add_argument("--days", type=int, default=365, help="Days of history the rows are spread over")
+        parser.add_argument(
+            "--until",
+            help="Date or ISO time the history ends at (default now); fix it to reproduce a seeded ledger",
+        )
+        parser.add_argument("--expense-ratio", type=float, default=0.2, help="Share of rows that are expenses")
+        parser.add_argument("--ngo-skew", type=float, default=1.1, help="Zipf exponent of NGO popularity")
+        parser.add_argument("--donor-skew", type=float, default=0.8, help="Zipf exponent of donor activity")
+        parser.add_argument("--bursts", type=int, default=25, help="Campaign bursts in the timeline")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Rows per bulk insert (COPY on PostgreSQL)")
+        parser.add_argument(
+            "--deferred-hash",
+            action="store_true",
+            help="Offline: store leaf hashes only and leave anchoring to anchor_transactions",
+        )
+        parser.add_argument("--prefix", default="synthetic", help="Prefix of generated usernames and ids")
+        parser.add_argument("--password", help="Password of every generated account (unusable if omitted)")
+        parser.add_argument(
+            "--seed", type=int, help="Random seed; the same seed and --until generate the same ledger"
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["ngos"] < 1:
+            raise CommandError("--users and --ngos must be at least 1")
+
+        end = None
+        if options["until"]:
+            try:
+                end = parse_datetime(options["until"])
+            except ValueError:
+                pass
+            if end is None:
+                raise CommandError(f"Invalid --until: {options['until']}")
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+
+        def report(inserted, elapsed):
+            self.stdout.write(
+                f"Inserted {inserted}/{options['transactions']} transactions ({inserted / elapsed:.0f} rows/s)"
+            )
+
+        try:
+            anchored = generate_ledger(
+                users=options["users"],
+                ngos=options["ngos"],
+                transactions=options["transactions"],
+                prefix=options["prefix"],
+                days=options["days"],
+                end=end,
+                expense_ratio=options["expense_ratio"],
+                ngo_skew=options["ngo_skew"],
+                donor_skew=options["donor_skew"],
+                bursts=options["bursts"],
+                batch_size=options["batch_size"],
+                deferred_hash=options["deferred_hash"],
+                password=options["password"],
+                seed=options["seed"],
+                report=report,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["deferred_hash"]:
+            self.stdout.write(self.style.SUCCESS("Generated ledger; run anchor_transactions to anchor it"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Generated ledger; anchored {anchored} transactions"))
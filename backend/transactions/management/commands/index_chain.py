@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.indexer import index_chain, rewind_to
+
+
+class Command(BaseCommand):
+    help = "Scan blocks from the last checkpoint and index the ledger records written on chain"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Blocks per JSON-RPC batch request")
+        parser.add_argument("--max-blocks", type=int, default=2000, help="Blocks indexed per database transaction")
+        parser.add_argument("--from-block", type=int, help="Drop what was indexed from this block on and restart there")
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between polls once caught up; 0 indexes once and exits"
+        )
+
+    def handle(self, *args, **options):
+        if options["from_block"] is not None:
+            rewind_to(options["from_block"])
+
+        while True:
+            blocks, records = index_chain(options["max_blocks"], options["batch_size"])
+            if blocks:
+                self.stdout.write(f"Indexed {blocks} block(s), {records} ledger record(s)")
+            # Keep going while catching up; poll at the interval once at the head
+            if blocks == options["max_blocks"]:
+                continue
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
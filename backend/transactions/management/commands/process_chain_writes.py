@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.outbox import process_next_chain_write
+
+
+class Command(BaseCommand):
+    help = "Send queued blockchain writes from the outbox and update their transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between polls; 0 drains what is due once and exits"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            while chain_write := process_next_chain_write():
+                self.stdout.write(
+                    f"Chain write for transaction {chain_write.transaction_id}: "
+                    f"{chain_write.status} after {chain_write.attempts} attempt(s)"
+                )
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.webhooks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Record the payments in queued Razorpay webhook events, a batch at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Events handled per DB transaction")
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between polls; 0 drains the inbox once and exits"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            while handled := process_webhook_events(options["batch_size"]):
+                self.stdout.write(f"Handled {handled} webhook event(s)")
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from transactions.aggregates import rebuild_ledger_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-NGO ledger summaries from scratch"
+
+    def handle(self, *args, **options):
+        count = rebuild_ledger_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ledger summaries for {count} NGOs"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from transactions.reconciliation import reconcile_ledger
+
+
+class Command(BaseCommand):
+    help = "Verify ledger rows against the blockchain, resuming from the last verified transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read from the database at a time")
+        parser.add_argument("--batch-size", type=int, default=100, help="Transactions per JSON-RPC batch request")
+        parser.add_argument("--workers", type=int, default=8, help="Batch requests in flight at once")
+        parser.add_argument("--full", action="store_true", help="Ignore the checkpoint and verify every row")
+
+    def handle(self, *args, **options):
+        counts = reconcile_ledger(
+            chunk_size=options["chunk_size"],
+            rpc_batch_size=options["batch_size"],
+            workers=options["workers"],
+            full=options["full"],
+            report=self.report,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Verified {counts['verified']}, missing {counts['missing']}, "
+                f"mismatched {counts['mismatched']}, legacy {counts['legacy']}, "
+                f"unanchored {counts['unanchored']}, not yet on chain {counts['undecided']}"
+            )
+        )
+
+    def report(self, checked, elapsed):
+        rate = checked / elapsed if elapsed else 0
+        self.stdout.write(f"Checked {checked} transactions in {elapsed:.1f}s ({rate:.0f} tx/s)")
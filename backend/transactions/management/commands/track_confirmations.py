@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.confirmations import track_confirmations
+
+
+class Command(BaseCommand):
+    help = "Record block number, gas used and confirmation depth for blockchain writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Maximum receipts fetched per cycle")
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between cycles; 0 polls once and exits"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            mined = track_confirmations(options["batch_size"])
+            self.stdout.write(f"Updated {mined} mined transaction(s)")
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,57 @@
+import json
+from decimal import Decimal
+
+from eth_utils import keccak
+
+
+def leaf_hash(ngo_id, user_id, transaction_type, amount, proof_url=None, description=None, razorpay_payment_id=None):
+    """
+    Hash the content of a ledger row into a Merkle leaf.
+    Everything that goes into the leaf is stored on the row, so anyone can recompute it.
+    """
+    content = [
+        int(ngo_id),
+        int(user_id),
+        transaction_type,
+        str(Decimal(str(amount)).quantize(Decimal("0.01"))),
+        proof_url or "",
+        description or "",
+        razorpay_payment_id or "",
+    ]
+    return "0x" + keccak(text=json.dumps(content, separators=(",", ":"))).hex()
+
+
+def _hash_pair(left, right):
+    # Sorting the pair means a proof is just the list of siblings, no left/right flags needed
+    return keccak(min(left, right) + max(left, right))
+
+
+def build_merkle_tree(leaves):
+    """
+    Build a Merkle tree over hex encoded leaves.
+    Returns the hex root and, for every leaf in order, its proof as a list of hex siblings.
+    """
+    level = [bytes.fromhex(leaf.removeprefix("0x")) for leaf in leaves]
+    positions = list(range(len(level)))
+    proofs = [[] for _ in level]
+
+    while len(level) > 1:
+        for leaf_index, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                proofs[leaf_index].append("0x" + level[sibling].hex())
+
+        # An odd node at the end of a level is promoted unchanged
+        level = [
+            _hash_pair(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)
+        ]
+        positions = [position // 2 for position in positions]
+
+    return "0x" + level[0].hex(), proofs
+
+
+def verify_merkle_proof(leaf, proof, root):
+    node = bytes.fromhex(leaf.removeprefix("0x"))
+    for sibling in proof:
+        node = _hash_pair(node, bytes.fromhex(sibling.removeprefix("0x")))
+    return "0x" + node.hex() == root
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def check_duplicate_payments(apps, schema_editor):
+    # Rows recorded twice for one payment by concurrent verifications. Each row's leaf hash and chain
+    # record commit to its payment id, so they cannot be rewritten here; an operator has to decide.
+    Transaction = apps.get_model('transactions', 'Transaction')
+    duplicates = (
+        Transaction.objects.filter(razorpay_payment_id__isnull=False)
+        .values('razorpay_payment_id')
+        .annotate(rows=Count('id'), first_id=Min('id'))
+        .filter(rows__gt=1)
+        .order_by('first_id')
+    )
+    listed = [f"{row['razorpay_payment_id']} (first row {row['first_id']})" for row in duplicates[:20]]
+    if listed:
+        raise RuntimeError(
+            'Cannot add tx_unique_razorpay_payment: some Razorpay payments are recorded more than once. '
+            'Keep the first row of each and delete or clear razorpay_payment_id on the others, then run '
+            'migrate again. Duplicated payments: ' + ', '.join(listed)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0005_chainnonce'),
+        ('transactions', '0007_transaction_receipt_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ngo', 'transaction_type', '-timestamp', '-id'], name='tx_ngo_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-timestamp', '-id'], name='tx_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='tx_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'amount'], name='tx_user_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['blockchain_hash'], name='tx_blockchain_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('anchor__isnull', True), ('blockchain_hash', '')), fields=['id'], name='tx_unanchored_idx'),
+        ),
+        migrations.RunPython(check_duplicate_payments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('razorpay_payment_id__isnull', False)), fields=('razorpay_payment_id',), name='tx_unique_razorpay_payment'),
+        ),
+    ]
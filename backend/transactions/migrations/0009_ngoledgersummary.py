@@ -0,0 +1,35 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from transactions.aggregates import rebuild_ledger_summaries
+
+
+def backfill(apps, schema_editor):
+    # Existing ledger rows; later inserts keep the new table up to date themselves
+    rebuild_ledger_summaries(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0005_chainnonce'),
+        ('transactions', '0008_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NGOLedgerSummary',
+            fields=[
+                ('ngo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger_summary', serialize=False, to='ngos.ngo')),
+                ('total_donated', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('expense_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from transactions.aggregates import rebuild_activity_rollups
+
+
+def backfill(apps, schema_editor):
+    # Existing ledger rows; later inserts keep the new table up to date themselves
+    rebuild_activity_rollups(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0005_chainnonce'),
+        ('transactions', '0009_ngoledgersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NGOActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('donated', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('expense_count', models.PositiveIntegerField(default=0)),
+                ('ngo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to='ngos.ngo')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ngoactivityrollup',
+            constraint=models.UniqueConstraint(fields=('ngo', 'bucket', 'period_start'), name='rollup_unique_period'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_ngoactivityrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='verification_status',
+            field=models.CharField(choices=[('unverified', 'Unverified'), ('verified', 'Verified'), ('missing', 'Missing'), ('mismatched', 'Mismatched')], default='unverified', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_ledger_verification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveBigIntegerField(unique=True)),
+                ('hash', models.CharField(max_length=66)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChainLedgerRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_hash', models.CharField(max_length=66, unique=True)),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('block_hash', models.CharField(max_length=66)),
+                ('kind', models.CharField(choices=[('donation', 'Donation'), ('expense', 'Expense'), ('merkle_root', 'Merkle root')], max_length=20)),
+                ('ngo_id', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('leaf_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('record_id', models.PositiveBigIntegerField()),
+                ('content_hash', models.CharField(max_length=66)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['block_number'], name='chain_record_block_idx'), models.Index(fields=['kind', 'record_id'], name='chain_record_kind_id_idx'), models.Index(fields=['ngo_id', 'kind', 'block_number'], name='chain_record_ngo_idx')],
+            },
+        ),
+    ]
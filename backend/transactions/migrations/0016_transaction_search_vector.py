@@ -0,0 +1,58 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:19
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# to_tsvector of a null description is null, so donations without one take no index space. A trigger
+# rather than save() keeps rows written with bulk_create or COPY searchable too. Must use the
+# configuration in transactions.search.
+CREATE_SQL = """
+CREATE FUNCTION transactions_transaction_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('english', NEW.description);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER transactions_transaction_search_vector
+BEFORE INSERT OR UPDATE OF description ON transactions_transaction
+FOR EACH ROW EXECUTE FUNCTION transactions_transaction_search_vector();
+
+UPDATE transactions_transaction SET search_vector = to_tsvector('english', description)
+WHERE description IS NOT NULL;
+
+CREATE INDEX tx_search_idx ON transactions_transaction USING gin (search_vector) WHERE search_vector IS NOT NULL;
+"""
+
+DROP_SQL = """
+DROP INDEX tx_search_idx;
+DROP TRIGGER transactions_transaction_search_vector ON transactions_transaction;
+DROP FUNCTION transactions_transaction_search_vector();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Other databases keep the column empty and search with substring matching
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0015_transaction_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
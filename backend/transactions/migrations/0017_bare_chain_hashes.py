@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:46
+
+from django.db import migrations
+from django.db.models.functions import Substr
+
+
+def strip_hash_prefixes(apps, schema_editor):
+    # index_chain used to keep the 0x on block hashes while stripping it from transaction hashes
+    ChainLedgerRecord = apps.get_model('transactions', 'ChainLedgerRecord')
+    IndexedBlock = apps.get_model('transactions', 'IndexedBlock')
+    ChainLedgerRecord.objects.filter(block_hash__startswith='0x').update(block_hash=Substr('block_hash', 3))
+    IndexedBlock.objects.filter(hash__startswith='0x').update(hash=Substr('hash', 3))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0016_transaction_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_hash_prefixes, migrations.RunPython.noop),
+    ]
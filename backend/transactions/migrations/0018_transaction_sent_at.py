@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reopen_unconfirmed(apps, schema_editor):
+    # "completed" used to mean sent; now it means final, so rows not deep enough yet go back to pending
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Transaction.objects.filter(status='completed', confirmations__lt=settings.BLOCKCHAIN_CONFIRMATIONS).exclude(
+        blockchain_hash=''
+    ).update(status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ngos', '0006_ngo_search_vector'),
+        ('transactions', '0017_bare_chain_hashes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'pending'), models.Q(('blockchain_hash', ''), _negated=True)), fields=['blockchain_hash'], name='tx_unconfirmed_idx'),
+        ),
+        migrations.RunPython(reopen_unconfirmed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0018_transaction_sent_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='verification_status',
+            field=models.CharField(choices=[('unverified', 'Unverified'), ('verified', 'Verified'), ('missing', 'Missing'), ('mismatched', 'Mismatched'), ('legacy', 'Legacy'), ('unanchored', 'Unanchored')], default='unverified', max_length=20),
+        ),
+    ]
@@ -1,6 +1,21 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from ngos.models import NGO
+from .merkle import leaf_hash
+
+
+class AnchorBatch(models.Model):
+    """A Merkle root over a batch of ledger rows, written to the chain in a single transaction."""
+
+    merkle_root = models.CharField(max_length=66)
+    blockchain_hash = models.CharField(max_length=66)
+    leaf_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.merkle_root} ({self.leaf_count} transactions)"
 
 
 class Transaction(models.Model):
@@ -16,20 +31,248 @@ class Transaction(models.Model):
     blockchain_hash = models.CharField(max_length=66)
     proof_url = models.URLField(blank=True, null=True)
     description = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # The description for full-text search (null without one), kept up to date by a trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    # A default rather than auto_now_add, so imports and generated ledgers can keep their own times
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     razorpay_order_id = models.CharField(max_length=255, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=255, blank=True, null=True)
     razorpay_signature = models.CharField(max_length=255, blank=True, null=True)
+    # "completed" once the chain write is BLOCKCHAIN_CONFIRMATIONS blocks deep (see track_confirmations)
     status = models.CharField(
         max_length=20,
         choices=[("pending", "Pending"), ("completed", "Completed"), ("failed", "Failed")],
         default="pending",
     )
+    # When the chain write carrying the row was sent
+    sent_at = models.DateTimeField(blank=True, null=True)
+    leaf_hash = models.CharField(max_length=66, blank=True, null=True)
+    anchor = models.ForeignKey(
+        AnchorBatch, related_name="transactions", on_delete=models.SET_NULL, blank=True, null=True
+    )
+    merkle_proof = models.JSONField(default=list, blank=True)
+    block_number = models.PositiveBigIntegerField(blank=True, null=True)
+    gas_used = models.PositiveBigIntegerField(blank=True, null=True)
+    confirmations = models.PositiveIntegerField(default=0)
+    verification_status = models.CharField(
+        max_length=20,
+        choices=[
+            ("unverified", "Unverified"),
+            ("verified", "Verified"),
+            ("missing", "Missing"),
+            ("mismatched", "Mismatched"),
+            # Written before chain writes carried a transactions.payload record
+            ("legacy", "Legacy"),
+            # Failed or never sent, so there is nothing on chain to check
+            ("unanchored", "Unanchored"),
+        ],
+        default="unverified",
+    )
+    verified_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # NGO donation/expense feeds, newest first
+            models.Index(fields=["ngo", "transaction_type", "-timestamp", "-id"], name="tx_ngo_type_time_idx"),
+            # Transaction list, unfiltered or filtered by user (with an optional amount range)
+            models.Index(fields=["-timestamp", "-id"], name="tx_time_idx"),
+            models.Index(fields=["user", "-timestamp", "-id"], name="tx_user_time_idx"),
+            models.Index(fields=["user", "amount"], name="tx_user_amount_idx"),
+            # Receipt tracking and reconciliation look rows up by chain hash
+            models.Index(fields=["blockchain_hash"], name="tx_blockchain_hash_idx"),
+            # Sent chain writes that are not final yet
+            models.Index(
+                fields=["blockchain_hash"],
+                condition=models.Q(status="pending") & ~models.Q(blockchain_hash=""),
+                name="tx_unconfirmed_idx",
+            ),
+            # Rows still waiting for a Merkle anchor
+            models.Index(
+                fields=["id"], condition=models.Q(anchor__isnull=True, blockchain_hash=""), name="tx_unanchored_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["razorpay_payment_id"],
+                condition=models.Q(razorpay_payment_id__isnull=False),
+                name="tx_unique_razorpay_payment",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type} - {self.ngo.name}"
 
+    def compute_leaf_hash(self):
+        return leaf_hash(
+            self.ngo_id,
+            self.user_id,
+            self.transaction_type,
+            self.amount,
+            self.proof_url,
+            self.description,
+            self.razorpay_payment_id,
+        )
+
     def save(self, *args, **kwargs):
-        if not self.blockchain_hash:
+        # Rows waiting to be anchored in a Merkle batch only have their leaf hash so far
+        if not self.blockchain_hash and not self.leaf_hash:
             raise ValueError("Blockchain hash is required")
         super().save(*args, **kwargs)
+
+
+class ChainWrite(models.Model):
+    """Outbox entry for a ledger row whose blockchain write is done by the process_chain_writes command."""
+
+    STATUSES = (
+        ("pending", "Pending"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    )
+
+    transaction = models.OneToOneField(Transaction, related_name="chain_write", on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.idempotency_key} - {self.status}"
+
+
+class NGOLedgerSummary(models.Model):
+    """Running totals per NGO, updated in the same DB transaction as every ledger insert."""
+
+    ngo = models.OneToOneField(NGO, related_name="ledger_summary", on_delete=models.CASCADE, primary_key=True)
+    total_donated = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_spent = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    donation_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.ngo_id} - balance {self.balance}"
+
+
+class NGOActivityRollup(models.Model):
+    """Donations and expenses of one NGO summed per day, week or month, updated on every ledger insert."""
+
+    BUCKETS = (
+        ("day", "Day"),
+        ("week", "Week"),
+        ("month", "Month"),
+    )
+
+    ngo = models.ForeignKey(NGO, related_name="activity_rollups", on_delete=models.CASCADE)
+    bucket = models.CharField(max_length=5, choices=BUCKETS)
+    period_start = models.DateField()
+    donated = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    spent = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    donation_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the (ngo, bucket, period_start range) lookups of the timeseries endpoint
+            models.UniqueConstraint(fields=["ngo", "bucket", "period_start"], name="rollup_unique_period"),
+        ]
+
+    def __str__(self):
+        return f"{self.ngo_id} - {self.bucket} {self.period_start}"
+
+
+class LedgerCheckpoint(models.Model):
+    """Position reached by an incremental ledger job, so reruns resume where the last run stopped."""
+
+    name = models.CharField(max_length=100, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.position}"
+
+
+class ChainLedgerRecord(models.Model):
+    """A ledger record decoded from the chain by index_chain, independent of the Transaction rows."""
+
+    KINDS = (
+        ("donation", "Donation"),
+        ("expense", "Expense"),
+        ("merkle_root", "Merkle root"),
+    )
+
+    transaction_hash = models.CharField(max_length=66, unique=True)
+    block_number = models.PositiveBigIntegerField()
+    block_hash = models.CharField(max_length=66)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    ngo_id = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    leaf_count = models.PositiveIntegerField(blank=True, null=True)
+    # Transaction id for donations and expenses, AnchorBatch id for Merkle roots
+    record_id = models.PositiveBigIntegerField()
+    content_hash = models.CharField(max_length=66)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["block_number"], name="chain_record_block_idx"),
+            models.Index(fields=["kind", "record_id"], name="chain_record_kind_id_idx"),
+            models.Index(fields=["ngo_id", "kind", "block_number"], name="chain_record_ngo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.record_id} - {self.transaction_hash}"
+
+
+class IndexedBlock(models.Model):
+    """Hash of a recently indexed block, kept for the last BLOCKCHAIN_CONFIRMATIONS blocks to detect reorgs."""
+
+    number = models.PositiveBigIntegerField(unique=True)
+    hash = models.CharField(max_length=66)
+
+    def __str__(self):
+        return f"{self.number} - {self.hash}"
+
+
+class PaymentOrder(models.Model):
+    """A Razorpay order created by CreateOrderView, kept so verifying its payment needs no remote fetch."""
+
+    order_id = models.CharField(max_length=255, unique=True)
+    ngo = models.ForeignKey(NGO, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.order_id} - {self.amount}"
+
+
+class WebhookEvent(models.Model):
+    """A Razorpay webhook delivery, stored as received and handled later by process_webhooks."""
+
+    STATUSES = (
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("ignored", "Ignored"),
+        ("failed", "Failed"),
+    )
+
+    # X-Razorpay-Event-Id, the same for every redelivery of an event
+    event_id = models.CharField(max_length=255, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUSES, default="pending")
+    error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(status="pending"), name="webhook_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id} - {self.status}"
@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ngos.cache import invalidate_ngos
+from ngos.utils import create_blockchain_record
+from .ledger import transactions_failed
+from .models import ChainWrite
+from .payload import encode_transaction
+
+
+def retry_delay(attempts):
+    """Exponential backoff between chain write attempts, capped at CHAIN_WRITE_MAX_BACKOFF seconds."""
+    return timedelta(seconds=min(settings.CHAIN_WRITE_BACKOFF * 2 ** (attempts - 1), settings.CHAIN_WRITE_MAX_BACKOFF))
+
+
+def process_next_chain_write():
+    """
+    Claim the next due outbox entry, send its blockchain write and record the outcome.
+
+    Claiming is a short DB transaction that locks the entry with SKIP LOCKED, counts the attempt
+    and pushes next_attempt_at CHAIN_WRITE_CLAIM_TIMEOUT seconds out, so other workers leave it
+    alone. The send happens with no DB transaction or lock held, and a second short transaction
+    records its outcome. Writes are at-least-once: if a worker dies after sending, the entry is
+    due again once the claim runs out and is sent again. Returns the entry, or None if nothing was due.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        chain_write = (
+            ChainWrite.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("transaction")
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")
+            .first()
+        )
+        if chain_write is None:
+            return None
+        chain_write.attempts += 1
+        chain_write.next_attempt_at = now + timedelta(seconds=settings.CHAIN_WRITE_CLAIM_TIMEOUT)
+        chain_write.save(update_fields=["attempts", "next_attempt_at"])
+
+    ledger_row = chain_write.transaction
+    transaction_hash = create_blockchain_record(encode_transaction(ledger_row))
+
+    with transaction.atomic():
+        if transaction_hash:
+            # The row stays pending until track_confirmations sees the write deep enough
+            ledger_row.blockchain_hash = transaction_hash
+            ledger_row.sent_at = timezone.now()
+            ledger_row.save(update_fields=["blockchain_hash", "sent_at"])
+            chain_write.status = "completed"
+            transaction.on_commit(lambda: invalidate_ngos([ledger_row.ngo_id]))
+        elif chain_write.attempts >= settings.CHAIN_WRITE_MAX_ATTEMPTS:
+            # Out of the ledger views, so out of the totals too
+            ledger_row.status = "failed"
+            ledger_row.save(update_fields=["status"])
+            transactions_failed([ledger_row])
+            chain_write.status = "failed"
+        else:
+            chain_write.next_attempt_at = timezone.now() + retry_delay(chain_write.attempts)
+        chain_write.save(update_fields=["status", "next_attempt_at"])
+
+    return chain_write
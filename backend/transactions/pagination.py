@@ -0,0 +1,108 @@
+import base64
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _pack(value, row_id):
+    raw = f"{value}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _unpack(cursor, parse):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, row_id = raw.split("|")
+        return parse(value), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_cursor(row):
+    return _pack(row["timestamp"].isoformat(), row["id"])
+
+
+def decode_cursor(cursor):
+    return _unpack(cursor, datetime.fromisoformat)
+
+
+def encode_rank_cursor(row):
+    # Ranks are rounded decimals (see transactions.search), so the text form is exact
+    return _pack(str(row["rank"]), row["id"])
+
+
+def _parse_rank(value):
+    try:
+        rank = Decimal(value)
+    except InvalidOperation:
+        raise ValueError("Invalid cursor")
+    if not rank.is_finite():
+        raise ValueError("Invalid cursor")
+    return rank
+
+
+def decode_rank_cursor(cursor):
+    return _unpack(cursor, _parse_rank)
+
+
+def get_page_size(page_size):
+    if not page_size:
+        return settings.TRANSACTION_PAGE_SIZE
+    return max(1, min(int(page_size), settings.TRANSACTION_MAX_PAGE_SIZE))
+
+
+def paginate_by_cursor(queryset, cursor=None, page_size=None, descending=True):
+    """
+    Keyset pagination over (timestamp, id) for a values() queryset that includes both columns.
+
+    The cursor points at the last row of the previous page, so rows inserted while a client
+    is paging only ever show up before its position and never shift later pages.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    page_size = get_page_size(page_size)
+
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        if descending:
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=row_id))
+        else:
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=row_id))
+
+    ordering = ("-timestamp", "-id") if descending else ("timestamp", "id")
+    # Fetch one extra row to know whether there is a next page
+    rows = list(queryset.order_by(*ordering)[: page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def paginate_by_rank(queryset, cursor=None, page_size=None):
+    """
+    Keyset pagination of search results over (rank, id), best match first, for a values()
+    queryset that includes both. rank must be the rounded decimal transactions.search annotates,
+    so the cursor compares equal to the row it came from. Returns (rows, next_cursor) like
+    paginate_by_cursor.
+    """
+    page_size = get_page_size(page_size)
+
+    if cursor:
+        rank, row_id = decode_rank_cursor(cursor)
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=row_id))
+
+    rows = list(queryset.order_by("-rank", "-id")[: page_size + 1])
+    next_cursor = encode_rank_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def paginated_response(request, rows, next_cursor, status=status.HTTP_200_OK):
+    """One page of rows (or a dict holding them), with the next page in the Link and X-Next-Cursor headers."""
+    response = Response(rows, status=status)
+    if next_cursor:
+        query = urlencode({**request.query_params.dict(), "cursor": next_cursor})
+        response["Link"] = f'<{request.build_absolute_uri(request.path)}?{query}>; rel="next"'
+        response["X-Next-Cursor"] = next_cursor
+    return response
@@ -0,0 +1,81 @@
+import struct
+from collections import namedtuple
+from decimal import Decimal
+
+# Every ledger write carries one fixed size record in its data field:
+#   magic "NGOL" | version | kind | NGO id (uint32) | amount in paise (uint64) | DB id (uint64) | content hash
+# The content hash is the row's 32 byte leaf hash.
+# For Merkle roots the NGO id is 0, the amount slot holds the leaf count and the hash is the root.
+MAGIC = b"NGOL"
+VERSION = 1
+RECORD = struct.Struct(">4sBBIQQ32s")
+KINDS = {"donation": 1, "expense": 2, "merkle_root": 3}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+# What a ledger record looks like as hex calldata, used to pick them out of arbitrary transaction inputs
+HEX_PREFIX = "0x" + (MAGIC + bytes([VERSION])).hex()
+HEX_LENGTH = 2 + RECORD.size * 2
+
+LedgerRecord = namedtuple("LedgerRecord", ["kind", "ngo_id", "amount", "record_id", "content_hash"])
+
+
+def to_paise(amount):
+    return int(Decimal(str(amount)).quantize(Decimal("0.01")) * 100)
+
+
+def encode_record(kind, ngo_id, amount, record_id, content_hash):
+    amount = amount if kind == "merkle_root" else to_paise(amount)
+    content_hash = bytes.fromhex(content_hash.removeprefix("0x"))
+    return RECORD.pack(MAGIC, VERSION, KINDS[kind], ngo_id, amount, record_id, content_hash)
+
+
+def encode_transaction(transaction):
+    """Payload for a saved ledger row; its leaf hash commits to the fields that do not fit in the record."""
+    return encode_record(
+        transaction.transaction_type, transaction.ngo_id, transaction.amount, transaction.id, transaction.leaf_hash
+    )
+
+
+def encode_anchor(batch):
+    """Payload for a saved AnchorBatch."""
+    return encode_record("merkle_root", 0, batch.leaf_count, batch.id, batch.merkle_root)
+
+
+def _record(fields):
+    _, _, kind, ngo_id, amount, record_id, content_hash = fields
+    kind = KIND_NAMES.get(kind)
+    if kind is None:
+        return None
+    if kind != "merkle_root":
+        amount = Decimal(amount).scaleb(-2)
+    return LedgerRecord(kind, ngo_id, amount, record_id, "0x" + content_hash.hex())
+
+
+def decode_record(data):
+    """Decode one payload (bytes or 0x hex); returns a LedgerRecord, or None if data is not a ledger record."""
+    return decode_records([data])[0]
+
+
+def decode_records(inputs):
+    """
+    Decode many transaction inputs at once, e.g. every transaction of a block range.
+
+    Inputs that look like ledger records are joined into one buffer and unpacked with a single
+    struct.iter_unpack pass instead of one unpack call per transaction. Returns a list parallel
+    to inputs holding a LedgerRecord or None for transactions that are not ledger writes.
+    """
+    records = [None] * len(inputs)
+    positions = []
+    chunks = []
+    for position, data in enumerate(inputs):
+        if isinstance(data, (bytes, bytearray)):
+            data = "0x" + data.hex()
+        if len(data) == HEX_LENGTH and data.startswith(HEX_PREFIX):
+            positions.append(position)
+            chunks.append(data[2:])
+
+    if chunks:
+        buffer = bytes.fromhex("".join(chunks))
+        for position, fields in zip(positions, RECORD.iter_unpack(buffer)):
+            records[position] = _record(fields)
+    return records
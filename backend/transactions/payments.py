@@ -0,0 +1,344 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import threading
+import uuid
+import weakref
+from decimal import Decimal
+
+import aiohttp
+import razorpay
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ngo_backend.metrics import timed
+from .ledger import queue_transaction
+from .models import PaymentOrder, Transaction
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def order_data(amount, ngo_id, user_id):
+    return {
+        "amount": int(float(amount) * 100),  # Convert to paise
+        "currency": "INR",
+        "receipt": f"order_rcptid_{ngo_id}_{user_id}",
+        "notes": {
+            "ngo_id": ngo_id,
+            "user_id": user_id,
+        },
+    }
+
+
+def order_response(order):
+    return {"order_id": order["id"], "amount": order["amount"], "currency": "INR", "key": settings.RAZORPAY_KEY_ID}
+
+
+def payment_signature(order_id, payment_id):
+    """The signature Razorpay Checkout returns for a payment of an order."""
+    message = f"{order_id}|{payment_id}".encode()
+    return hmac.new((settings.RAZORPAY_KEY_SECRET or "").encode(), message, hashlib.sha256).hexdigest()
+
+
+def payment_order(order):
+    """PaymentOrder row for an order dict returned by the gateway."""
+    return PaymentOrder(
+        order_id=order["id"],
+        ngo_id=order["notes"]["ngo_id"],
+        user_id=order["notes"]["user_id"],
+        amount=Decimal(order["amount"]) / 100,
+    )
+
+
+def donation_fields(payment, payment_id, order_id, signature):
+    """Ledger row fields for a verified Razorpay payment."""
+    return {
+        "ngo_id": payment["notes"]["ngo_id"],
+        "user_id": payment["notes"]["user_id"],
+        "amount": float(payment["amount"]) / 100,  # Convert from paise to rupees
+        "transaction_type": "donation",
+        "razorpay_order_id": order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+    }
+
+
+def order_donation_fields(order, payment_id, signature):
+    """Ledger row fields for a verified payment of an order created here."""
+    return {
+        "ngo_id": order.ngo_id,
+        "user_id": order.user_id,
+        "amount": order.amount,
+        "transaction_type": "donation",
+        "razorpay_order_id": order.order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+    }
+
+
+def payment_response(transaction):
+    return {
+        "status": "success",
+        "transaction_id": transaction.id,
+        "transaction_status": transaction.status,
+        "blockchain_hash": transaction.blockchain_hash,
+        "leaf_hash": transaction.leaf_hash,
+    }
+
+
+class RazorpayGateway:
+    """
+    Razorpay behind the calls the payment views make, with sync and async variants of each.
+
+    The sync client shares one keep-alive session with a bounded connection pool, every call
+    has (connect, read) timeouts, and failed calls are retried RAZORPAY_RETRIES times. Orders
+    are only retried when the connection could not be made, so one is never created twice.
+    Created orders are stored as PaymentOrder rows, so verify_payment() only has to check the
+    signature of a payment of one of them and does not fetch the payment from Razorpay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._sessions = weakref.WeakKeyDictionary()
+
+    @property
+    def timeout(self):
+        return (settings.RAZORPAY_CONNECT_TIMEOUT, settings.RAZORPAY_TIMEOUT)
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                retry = Retry(
+                    total=settings.RAZORPAY_RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset({"GET"}),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_maxsize=settings.RAZORPAY_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._client = razorpay.Client(
+                    session=session,
+                    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                    base_url=settings.RAZORPAY_BASE_URL,
+                )
+            return self._client
+
+    def _new_async_session(self):
+        return aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth(settings.RAZORPAY_KEY_ID or "", settings.RAZORPAY_KEY_SECRET or ""),
+            timeout=aiohttp.ClientTimeout(
+                total=settings.RAZORPAY_CONNECT_TIMEOUT + settings.RAZORPAY_TIMEOUT,
+                connect=settings.RAZORPAY_CONNECT_TIMEOUT,
+            ),
+            connector=aiohttp.TCPConnector(limit=settings.RAZORPAY_POOL_SIZE),
+        )
+
+    @contextlib.asynccontextmanager
+    async def async_session(self):
+        """
+        The aiohttp session for one call. Under ASGI (ASYNC_VIEWS) the event loop lasts as long as
+        the process, so each loop keeps a pooled session. Otherwise every request may get a
+        short-lived loop of its own (WSGI, async_to_sync), and the session is closed after the call
+        instead of being left open when its loop goes away.
+        """
+        if not settings.ASYNC_VIEWS:
+            async with self._new_async_session() as session:
+                yield session
+            return
+
+        # aiohttp sessions belong to an event loop, so there is one pool per loop
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = self._new_async_session()
+            self._sessions[loop] = session
+        yield session
+
+    async def async_request(self, method, path, **kwargs):
+        with timed("razorpay"):
+            async with self.async_session() as session:
+                return await self._async_request(session, method, path, **kwargs)
+
+    async def _async_request(self, session, method, path, **kwargs):
+        url = settings.RAZORPAY_BASE_URL + path
+        for attempt in range(settings.RAZORPAY_RETRIES + 1):
+            retry = attempt < settings.RAZORPAY_RETRIES
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and method == "GET" and retry:
+                        continue
+                    body = await response.json(content_type=None)
+            except aiohttp.ClientConnectorError:
+                if retry:
+                    continue
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if method == "GET" and retry:
+                    continue
+                raise
+
+            if response.status >= 400:
+                # Same exceptions as the razorpay SDK raises
+                error = razorpay.errors.ServerError if response.status >= 500 else razorpay.errors.BadRequestError
+                raise error((body or {}).get("error", {}).get("description", f"Razorpay returned {response.status}"))
+            return body
+
+    def request_order(self, data):
+        with timed("razorpay"):
+            return self.client.order.create(data=data, timeout=self.timeout)
+
+    async def arequest_order(self, data):
+        return await self.async_request("POST", "/v1/orders", json=data)
+
+    def fetch_payment(self, payment_id):
+        with timed("razorpay"):
+            return self.client.payment.fetch(payment_id, timeout=self.timeout)
+
+    async def afetch_payment(self, payment_id):
+        return await self.async_request("GET", f"/v1/payments/{payment_id}")
+
+    def verify_signature(self, payment_id, order_id, signature):
+        if not hmac.compare_digest(payment_signature(order_id, payment_id), str(signature)):
+            raise razorpay.errors.SignatureVerificationError("Razorpay Signature Verification Failed")
+
+    def create_order(self, amount, ngo_id, user_id):
+        order = self.request_order(order_data(amount, ngo_id, user_id))
+        payment_order(order).save()
+        return order
+
+    async def acreate_order(self, amount, ngo_id, user_id):
+        order = await self.arequest_order(order_data(amount, ngo_id, user_id))
+        await payment_order(order).asave()
+        return order
+
+
+class FakeRazorpayGateway(RazorpayGateway):
+    """
+    Local stand-in for Razorpay: orders get generated ids and no request leaves the process.
+    complete_payment() plays the part of Checkout and returns validly signed payment details.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.payments = {}
+
+    def request_order(self, data):
+        return {"id": f"order_{uuid.uuid4().hex[:14]}", "entity": "order", "status": "created", **data}
+
+    async def arequest_order(self, data):
+        return self.request_order(data)
+
+    def fetch_payment(self, payment_id):
+        if payment_id not in self.payments:
+            raise razorpay.errors.BadRequestError("The id provided does not exist")
+        return self.payments[payment_id]
+
+    async def afetch_payment(self, payment_id):
+        return self.fetch_payment(payment_id)
+
+    def complete_payment(self, order):
+        """Pay an order returned by create_order; returns the fields Checkout posts to the verify endpoint."""
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        self.payments[payment_id] = {
+            "id": payment_id,
+            "order_id": order["id"],
+            "amount": order["amount"],
+            "status": "captured",
+            "notes": order["notes"],
+        }
+        return {
+            "razorpay_payment_id": payment_id,
+            "razorpay_order_id": order["id"],
+            "razorpay_signature": payment_signature(order["id"], payment_id),
+        }
+
+
+GATEWAYS = {"razorpay": RazorpayGateway, "fake": FakeRazorpayGateway}
+_gateways = {}
+
+
+def get_gateway():
+    """The gateway named by PAYMENT_GATEWAY, created on first use."""
+    name = settings.PAYMENT_GATEWAY
+    if name not in _gateways:
+        _gateways[name] = GATEWAYS[name]()
+    return _gateways[name]
+
+
+def _record_payment(payment_id, order_id, signature, payment=None):
+    """
+    Queue the donation of a payment whose signature was verified, unless it is already recorded.
+    payment is the Razorpay payment entity, which callers fetch before this opens its DB
+    transaction when order_id has no PaymentOrder row; nothing here waits on Razorpay.
+    """
+    with db_transaction.atomic():
+        order = PaymentOrder.objects.select_for_update().filter(order_id=order_id).first()
+        transaction = Transaction.objects.filter(razorpay_payment_id=payment_id).first()
+        if transaction:
+            return transaction, False
+
+        if order:
+            fields = order_donation_fields(order, payment_id, signature)
+        else:
+            # Orders created before they were stored here
+            fields = donation_fields(payment, payment_id, order_id, signature)
+
+        try:
+            with db_transaction.atomic():
+                return queue_transaction(payment_id, **fields), True
+        except IntegrityError:
+            # With no order row to lock, the unique payment id decides which request wins
+            return Transaction.objects.get(razorpay_payment_id=payment_id), False
+
+
+def verify_payment(payment_id, order_id, signature):
+    """
+    Verify a Checkout payment and queue its donation, once per payment id.
+
+    The signature is checked first, so only a caller holding the signed order and payment ids
+    gets a stored transaction back. A replay is then answered without calling Razorpay or the
+    chain. Concurrent verifications of one order wait for each other on its locked PaymentOrder
+    row, so only the first creates the transaction and the others return it.
+    Returns (transaction, created).
+    """
+    gateway = get_gateway()
+    gateway.verify_signature(payment_id, order_id, signature)
+
+    transaction = Transaction.objects.filter(razorpay_payment_id=payment_id).first()
+    if transaction:
+        return transaction, False
+
+    payment = None
+    if not PaymentOrder.objects.filter(order_id=order_id).exists():
+        # Fetched before any DB transaction opens, so no lock is held across the HTTP round trip
+        payment = gateway.fetch_payment(payment_id)
+    return _record_payment(payment_id, order_id, signature, payment)
+
+
+async def averify_payment(payment_id, order_id, signature):
+    """
+    verify_payment() for async views. Replays are answered by the async ORM and a payment of an
+    order not stored here is fetched with the async client; only the locked insert runs in a thread.
+    """
+    gateway = get_gateway()
+    gateway.verify_signature(payment_id, order_id, signature)
+
+    transaction = await Transaction.objects.filter(razorpay_payment_id=payment_id).afirst()
+    if transaction:
+        return transaction, False
+
+    payment = None
+    if not await PaymentOrder.objects.filter(order_id=order_id).aexists():
+        payment = await gateway.afetch_payment(payment_id)
+    # Row locking needs a DB transaction, which the async ORM cannot hold
+    return await sync_to_async(_record_payment)(payment_id, order_id, signature, payment)
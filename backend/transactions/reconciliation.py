@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.utils import timezone
+
+from ngos.utils import ACCOUNT_ADDRESS, get_chain_transactions
+from .merkle import verify_merkle_proof
+from .models import LedgerCheckpoint, Transaction
+from .payload import decode_records
+
+CHECKPOINT_NAME = "reconcile_ledger"
+
+
+def chain_record_status(row, chain_tx, receipt, record):
+    """
+    Compare a ledger row with what the chain holds for its blockchain_hash, where record is
+    the decoded payload of chain_tx. Returns "verified", "missing", "mismatched", "legacy" for
+    rows written before writes carried a payload, "unanchored" for rows that failed or were never
+    sent, or None while the row's write is still queued or not mined yet.
+    """
+    if row.status == "failed":
+        # Not part of the ledger, whatever the chain holds for it
+        return "unanchored"
+    if not row.blockchain_hash:
+        # Waiting for the outbox or an anchor batch, or an old row that was never sent
+        return None if row.status == "pending" and row.leaf_hash else "unanchored"
+    if chain_tx is None:
+        return "missing"
+    if receipt is None:
+        return None
+    if receipt.get("status") != "0x1" or chain_tx["from"].lower() != ACCOUNT_ADDRESS.lower():
+        return "mismatched"
+    # The leaf is the hash of the row's content, so a changed row no longer matches it
+    if row.leaf_hash and row.leaf_hash != row.compute_leaf_hash():
+        return "mismatched"
+
+    if row.anchor_id:
+        if record is None:
+            return "mismatched"
+        # Anchored rows: the chain carries the Merkle root and the row's proof must lead to it
+        root = row.anchor.merkle_root
+        if record.kind != "merkle_root" or record.content_hash != root:
+            return "mismatched"
+        if not verify_merkle_proof(row.leaf_hash, row.merkle_proof, root):
+            return "mismatched"
+    elif record is None:
+        # A plain write from our account, as sent before transactions.payload existed
+        return "legacy"
+    elif record != (row.transaction_type, row.ngo_id, row.amount, row.id, row.leaf_hash):
+        return "mismatched"
+
+    return "verified"
+
+
+def _batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def reconcile_ledger(chunk_size=1000, rpc_batch_size=100, workers=8, full=False, report=None):
+    """
+    Check every ledger row against the chain, streaming rows from the last checkpoint.
+
+    Each chunk's hashes are split into batched JSON-RPC requests fetched in parallel by a
+    thread pool. Rows get a verification_status (see chain_record_status), and the checkpoint
+    advances past every row that could be decided; rows whose write is still queued or not mined
+    yet are picked up again next run.
+    report(checked, elapsed) is called after each chunk. Returns {status: count}.
+    """
+    checkpoint, _ = LedgerCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    if full:
+        checkpoint.position = 0
+
+    rows = (
+        Transaction.objects.filter(id__gt=checkpoint.position)
+        .select_related("anchor")
+        .order_by("id")
+        .iterator(chunk_size=chunk_size)
+    )
+    counts = {"verified": 0, "missing": 0, "mismatched": 0, "legacy": 0, "unanchored": 0, "undecided": 0}
+    checked = 0
+    waiting = False
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in _batches(rows, chunk_size):
+            hashes = list({row.blockchain_hash for row in chunk if row.blockchain_hash and row.status != "failed"})
+            chain = {}
+            for result in executor.map(get_chain_transactions, _batches(hashes, rpc_batch_size)):
+                chain.update(result)
+            # Decode the whole chunk's payloads in one pass
+            inputs = [chain[tx_hash][0]["input"] if chain[tx_hash][0] else "" for tx_hash in hashes]
+            records = dict(zip(hashes, decode_records(inputs)))
+
+            now = timezone.now()
+            decided = []
+            for row in chunk:
+                chain_tx, receipt = chain.get(row.blockchain_hash, (None, None))
+                status = chain_record_status(row, chain_tx, receipt, records.get(row.blockchain_hash))
+                if status is None:
+                    counts["undecided"] += 1
+                    # Later rows are still checked, but the checkpoint must not skip this one
+                    waiting = True
+                    continue
+                counts[status] += 1
+                row.verification_status = status
+                row.verified_at = now
+                decided.append(row)
+                if not waiting:
+                    checkpoint.position = row.id
+
+            Transaction.objects.bulk_update(decided, ["verification_status", "verified_at"])
+            checkpoint.save(update_fields=["position", "updated_at"])
+
+            checked += len(chunk)
+            if report:
+                report(checked, time.monotonic() - started)
+
+    return counts
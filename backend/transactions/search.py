@@ -0,0 +1,63 @@
+"""
+Full-text search over NGOs and transaction descriptions.
+
+On PostgreSQL the search_vector columns are matched against a websearch query ("clean water",
+food -seeds, tents or tarps) and ranked with ts_rank. Database triggers keep the columns up to
+date and GIN indexes serve the matching (see ngos migration 0006 and transactions migration
+0016). Other databases, used in development, fall back to substring matching with every match
+ranked the same.
+
+Ranks are rounded to RANK_FIELD's six decimal places: ts_rank returns a real, and comparing
+reals with the value a page cursor carries back is not exact, so rows could repeat or go missing
+between pages. Rounded numerics sort and compare exactly in both the ORDER BY and the cursor.
+"""
+
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Count, DecimalField, F, Q, Value
+from django.db.models.functions import Cast
+
+from .models import Transaction
+
+# Text search configuration the triggers build the vectors with
+SEARCH_CONFIG = "english"
+# Bounds of the amount facet buckets; the last bucket has no upper bound
+AMOUNT_BUCKETS = (0, 100, 1000, 10000, 100000)
+# Precision search results are ranked and paged at
+RANK_FIELD = DecimalField(max_digits=12, decimal_places=6)
+
+
+def search(queryset, text, fallback_fields):
+    """queryset narrowed to the rows matching text, each annotated with its rank."""
+    if connection.vendor == "postgresql":
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        # CAST(ts_rank(...) AS numeric(12, 6)) rounds the real to a value a cursor carries exactly
+        rank = Cast(SearchRank(F("search_vector"), query), RANK_FIELD)
+        return queryset.filter(search_vector=query).annotate(rank=rank)
+
+    matches = Q()
+    for field in fallback_fields:
+        matches |= Q(**{f"{field}__icontains": text})
+    return queryset.filter(matches).annotate(rank=Value(Decimal("0"), output_field=RANK_FIELD))
+
+
+def transaction_facets(queryset):
+    """
+    Counts of the transactions in queryset per type and per amount bucket, in a single query.
+    The search view passes the matches before its type filter, so both facets count every type.
+    """
+    buckets = list(zip(AMOUNT_BUCKETS, AMOUNT_BUCKETS[1:] + (None,)))
+    counts = {f"type_{name}": Count("id", filter=Q(transaction_type=name)) for name, _ in Transaction.TRANSACTION_TYPES}
+    for i, (low, high) in enumerate(buckets):
+        in_bucket = Q(amount__gte=low) if high is None else Q(amount__gte=low, amount__lt=high)
+        counts[f"amount_{i}"] = Count("id", filter=in_bucket)
+    totals = queryset.aggregate(**counts)
+
+    return {
+        "transaction_type": {name: totals[f"type_{name}"] for name, _ in Transaction.TRANSACTION_TYPES},
+        "amount": [
+            {"min": low, "max": high, "count": totals[f"amount_{i}"]} for i, (low, high) in enumerate(buckets)
+        ],
+    }
@@ -1,9 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from .views import TransactionDetailView, CreateOrderView, PaymentVerificationView, TransactionListView
+from .async_views import AsyncCreateOrderView, AsyncPaymentVerificationView
+from .views import (
+    TransactionDetailView,
+    CreateOrderView,
+    PaymentVerificationView,
+    RazorpayWebhookView,
+    TransactionListView,
+    TransactionExportView,
+    TransactionSearchView,
+)
 
 urlpatterns = [
     path("<int:transaction_id>/", TransactionDetailView.as_view(), name="transaction_detail"),
-    path("create-order/<int:ngo_id>/", CreateOrderView.as_view(), name="create_order"),
-    path("payment/verify/", PaymentVerificationView.as_view(), name="verify_payment"),
+    # The Razorpay-bound endpoints have async versions for ASGI deployments
+    path(
+        "create-order/<int:ngo_id>/",
+        (AsyncCreateOrderView if settings.ASYNC_VIEWS else CreateOrderView).as_view(),
+        name="create_order",
+    ),
+    path(
+        "payment/verify/",
+        (AsyncPaymentVerificationView if settings.ASYNC_VIEWS else PaymentVerificationView).as_view(),
+        name="verify_payment",
+    ),
+    path("webhooks/razorpay/", RazorpayWebhookView.as_view(), name="razorpay_webhook"),
     path("list/", TransactionListView.as_view(), name="transaction_list"),
+    path("search/", TransactionSearchView.as_view(), name="search_transactions"),
+    path("export/", TransactionExportView.as_view(), name="transaction_export"),
 ]
@@ -3,25 +3,40 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Transaction
 from django.conf import settings
-from rest_framework.permissions import IsAuthenticated
-import razorpay
-from ngos.utils import create_blockchain_record
-from django.db import transaction
-
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from .payments import get_gateway, order_response, payment_response, verify_payment
+from .pagination import paginate_by_cursor, paginate_by_rank, paginated_response
+from .search import search, transaction_facets
+from .webhooks import receive_webhook
+from datetime import datetime, time, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+import csv
+import json
 
 
 class TransactionDetailView(APIView):
     def get(self, request, transaction_id):
         try:
-            transaction = Transaction.objects.get(id=transaction_id)
+            transaction = Transaction.objects.select_related("ngo", "anchor").get(id=transaction_id)
             transaction_data = {
                 "id": transaction.id,
                 "ngo": transaction.ngo.name,
                 "transaction_type": transaction.transaction_type,
                 "amount": transaction.amount,
+                "status": transaction.status,
                 "blockchain_hash": transaction.blockchain_hash,
                 "proof_url": transaction.proof_url,
+                # Inclusion proof for rows anchored in a Merkle batch
+                "leaf_hash": transaction.leaf_hash,
+                "merkle_root": transaction.anchor.merkle_root if transaction.anchor else None,
+                "merkle_proof": transaction.merkle_proof,
+                # Finality, filled in by the track_confirmations worker
+                "block_number": transaction.block_number,
+                "gas_used": transaction.gas_used,
+                "confirmations": transaction.confirmations,
             }
             return Response(transaction_data, status=status.HTTP_200_OK)
         except Transaction.DoesNotExist:
@@ -33,71 +48,24 @@ class CreateOrderView(APIView):
 
     def post(self, request, ngo_id):
         try:
-            amount = int(float(request.data.get("amount")) * 100)  # Convert to paise
-
-            order_data = {
-                "amount": amount,
-                "currency": "INR",
-                "receipt": f"order_rcptid_{ngo_id}_{request.user.id}",
-                "notes": {
-                    "ngo_id": ngo_id,
-                    "user_id": request.user.id,
-                },
-            }
-
-            order = client.order.create(data=order_data)
-
-            return Response(
-                {"order_id": order["id"], "amount": amount, "currency": "INR", "key": settings.RAZORPAY_KEY_ID}
-            )
+            order = get_gateway().create_order(request.data.get("amount"), ngo_id, request.user.id)
+            return Response(order_response(order))
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class PaymentVerificationView(APIView):
-    @transaction.atomic  # Use Django's transaction management
     def post(self, request):
         try:
             payment_id = request.data.get("razorpay_payment_id")
             order_id = request.data.get("razorpay_order_id")
             signature = request.data.get("razorpay_signature")
 
-            # First verify Razorpay payment
-            params_dict = {
-                "razorpay_payment_id": payment_id,
-                "razorpay_order_id": order_id,
-                "razorpay_signature": signature,
-            }
-
-            # Verify signature
-            client.utility.verify_payment_signature(params_dict)
-
-            # Get payment details
-            payment = client.payment.fetch(payment_id)
-            amount = float(payment["amount"]) / 100  # Convert from paise to rupees
-            ngo_id = payment["notes"]["ngo_id"]
-
-            # Create blockchain record first
-            transaction_hash = create_blockchain_record(amount, "donation", ngo_id)
-
-            if not transaction_hash:
-                raise ValueError("Failed to create blockchain record")
-
-            # Only create transaction if blockchain record exists
-            transaction = Transaction.objects.create(
-                ngo_id=ngo_id,
-                user_id=payment["notes"]["user_id"],
-                amount=amount,
-                transaction_type="donation",
-                blockchain_hash=transaction_hash,  # Required field
-                razorpay_order_id=order_id,
-                razorpay_payment_id=payment_id,
-                razorpay_signature=signature,
-                status="completed",
-            )
-
+            # Replays and concurrent duplicates get the transaction that is already recorded;
+            # the blockchain write of a new one happens in the background worker
+            transaction, created = verify_payment(payment_id, order_id, signature)
             return Response(
-                {"status": "success", "transaction_id": transaction.id, "blockchain_hash": transaction_hash}
+                payment_response(transaction), status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
             )
 
         except ValueError as e:
@@ -106,45 +74,212 @@ class PaymentVerificationView(APIView):
             return Response({"error": "Payment verification failed: " + str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class RazorpayWebhookView(APIView):
+    # Razorpay proves who it is with the payload signature, not a token
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            accepted = receive_webhook(
+                request.body,
+                request.headers.get("X-Razorpay-Signature"),
+                request.headers.get("X-Razorpay-Event-Id"),
+            )
+        except ValueError:
+            return Response({"error": "Invalid JSON payload"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not accepted:
+            return Response({"error": "Invalid webhook signature"}, status=status.HTTP_400_BAD_REQUEST)
+        # Acknowledged as soon as it is stored; process_webhooks records the payment
+        return Response({"status": "ok"}, status=status.HTTP_200_OK)
+
+
+def filter_transactions(params):
+    """Transactions matching the list/export query parameters."""
+    # Get filter parameters
+    user_id = params.get("user_id")
+    ngo_id = params.get("ngo_id")
+    min_amount = params.get("min_amount")
+    max_amount = params.get("max_amount")
+    start = params.get("start")
+    end = params.get("end")
+
+    # Start with all transactions; rows whose chain write failed are not part of the ledger
+    transactions = Transaction.objects.exclude(status="failed")
+
+    # Apply filters
+    if user_id:
+        transactions = transactions.filter(user_id=user_id)
+    if ngo_id:
+        transactions = transactions.filter(ngo_id=ngo_id)
+    if min_amount:
+        transactions = transactions.filter(amount__gte=float(min_amount))
+    if max_amount:
+        transactions = transactions.filter(amount__lte=float(max_amount))
+    # Inclusive YYYY-MM-DD dates, compared as timestamp ranges so the indexes still apply
+    if start:
+        transactions = transactions.filter(timestamp__gte=start_of_day(start))
+    if end:
+        transactions = transactions.filter(timestamp__lt=start_of_day(end) + timedelta(days=1))
+    return transactions
+
+
+def start_of_day(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 class TransactionListView(APIView):
     def get(self, request):
         try:
-            # Get filter parameters
-            user_id = request.query_params.get("user_id")
-            min_amount = request.query_params.get("min_amount")
-            max_amount = request.query_params.get("max_amount")
             sort_order = request.query_params.get("sort_order", "desc")  # Default to descending
+            transactions = filter_transactions(request.query_params)
 
-            # Start with all transactions
-            transactions = Transaction.objects.all()
-
-            # Apply filters
-            if user_id:
-                transactions = transactions.filter(user_id=user_id)
-            if min_amount:
-                transactions = transactions.filter(amount__gte=float(min_amount))
-            if max_amount:
-                transactions = transactions.filter(amount__lte=float(max_amount))
+            # Serialize the data, joining the NGO and user names in the same query
+            transactions = transactions.values(
+                "id",
+                "ngo__name",
+                "user__username",
+                "transaction_type",
+                "amount",
+                "blockchain_hash",
+                "proof_url",
+                "timestamp",
+                "confirmations",
+            )
 
-            # Apply sorting
-            sort_field = "-timestamp" if sort_order == "desc" else "timestamp"
-            transactions = transactions.order_by(sort_field)
+            # Apply sorting and fetch one page
+            transactions, next_cursor = paginate_by_cursor(
+                transactions,
+                request.query_params.get("cursor"),
+                request.query_params.get("page_size"),
+                descending=sort_order == "desc",
+            )
 
-            # Serialize the data
             transaction_data = [
                 {
-                    "id": tx.id,
-                    "ngo": tx.ngo.name,
-                    "user": tx.user.username,
-                    "transaction_type": tx.transaction_type,
-                    "amount": tx.amount,
-                    "blockchain_hash": tx.blockchain_hash,
-                    "proof_url": tx.proof_url,
-                    "timestamp": tx.timestamp,
+                    "id": tx["id"],
+                    "ngo": tx["ngo__name"],
+                    "user": tx["user__username"],
+                    "transaction_type": tx["transaction_type"],
+                    "amount": tx["amount"],
+                    "blockchain_hash": tx["blockchain_hash"],
+                    "proof_url": tx["proof_url"],
+                    "timestamp": tx["timestamp"],
+                    "confirmations": tx["confirmations"],
                 }
                 for tx in transactions
             ]
 
-            return Response(transaction_data, status=status.HTTP_200_OK)
+            return paginated_response(request, transaction_data, next_cursor)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+SEARCH_FIELDS = ("id", "ngo__name", "transaction_type", "amount", "description", "blockchain_hash", "timestamp", "rank")
+
+
+class TransactionSearchView(APIView):
+    def get(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            matches = search(filter_transactions(request.query_params), text, ("description",))
+            # Facets are counted after every other filter (NGO, user, amount range, dates) but before
+            # the type filter, so clients can show how many matches each type has. The amount buckets
+            # therefore count matches of both types too.
+            facets = transaction_facets(matches)
+            transaction_type = request.query_params.get("type")
+            if transaction_type:
+                if transaction_type not in dict(Transaction.TRANSACTION_TYPES):
+                    raise ValueError("type must be donation or expense")
+                matches = matches.filter(transaction_type=transaction_type)
+
+            transactions, next_cursor = paginate_by_rank(
+                matches.values(*SEARCH_FIELDS),
+                request.query_params.get("cursor"),
+                request.query_params.get("page_size"),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {
+                "id": tx["id"],
+                "ngo": tx["ngo__name"],
+                "transaction_type": tx["transaction_type"],
+                "amount": tx["amount"],
+                "description": tx["description"],
+                "blockchain_hash": tx["blockchain_hash"],
+                "timestamp": tx["timestamp"],
+                "rank": tx["rank"],
+            }
+            for tx in transactions
+        ]
+        return paginated_response(request, {"results": results, "facets": facets}, next_cursor)
+
+
+class Echo:
+    """File-like object whose write returns the value, so csv.writer can feed a streaming response."""
+
+    def write(self, value):
+        return value
+
+
+class TransactionExportView(APIView):
+    EXPORT_COLUMNS = (
+        "id",
+        "timestamp",
+        "ngo_id",
+        "ngo__name",
+        "user__username",
+        "transaction_type",
+        "amount",
+        "status",
+        "blockchain_hash",
+        "leaf_hash",
+        "razorpay_payment_id",
+        "proof_url",
+        "description",
+    )
+    # Column names in the export (ngo__name -> ngo, user__username -> user)
+    EXPORT_HEADER = tuple(column.split("__")[0] for column in EXPORT_COLUMNS)
+
+    def get(self, request):
+        # "format" is reserved by DRF for content negotiation
+        output = request.query_params.get("output", "csv")
+        if output not in ("csv", "ndjson"):
+            return Response({"error": "output must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            transactions = filter_transactions(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Server-side cursor: rows are fetched chunk by chunk while the response streams
+        rows = (
+            transactions.order_by("id")
+            .values_list(*self.EXPORT_COLUMNS)
+            .iterator(chunk_size=settings.TRANSACTION_EXPORT_CHUNK_SIZE)
+        )
+
+        if output == "csv":
+            writer = csv.writer(Echo())
+            content = (writer.writerow(row) for row in self.with_header(rows))
+            content_type = "text/csv"
+        else:
+            content = (json.dumps(dict(zip(self.EXPORT_HEADER, row)), cls=DjangoJSONEncoder) + "\n" for row in rows)
+            content_type = "application/x-ndjson"
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="ledger.{output}"'
+        return response
+
+    def with_header(self, rows):
+        yield self.EXPORT_HEADER
+        yield from rows
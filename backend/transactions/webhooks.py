@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+
+from ngos.models import NGO
+from .anchoring import anchor_pending_transactions
+from .ledger import transactions_inserted
+from .models import PaymentOrder, Transaction, WebhookEvent
+from .payments import donation_fields, order_donation_fields
+
+# Events that mean a payment went through
+PAYMENT_EVENTS = {"payment.captured", "order.paid"}
+
+
+def webhook_signature(body):
+    return hmac.new((settings.RAZORPAY_WEBHOOK_SECRET or "").encode(), body, hashlib.sha256).hexdigest()
+
+
+def receive_webhook(body, signature, event_id=None):
+    """
+    Check a delivery's signature and append it to the inbox with a single INSERT.
+    Redeliveries of an event are dropped by its unique id. Returns False if the signature is wrong,
+    raises ValueError if the body is not a JSON object.
+    """
+    if not settings.RAZORPAY_WEBHOOK_SECRET or not hmac.compare_digest(webhook_signature(body), signature or ""):
+        return False
+
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Webhook payload is not a JSON object")
+    event = WebhookEvent(
+        event_id=event_id or hashlib.sha256(body).hexdigest(),
+        event=str(data.get("event", "")),
+        payload=data,
+    )
+    WebhookEvent.objects.bulk_create([event], ignore_conflicts=True)
+    return True
+
+
+def _payment_entity(event):
+    if event.event not in PAYMENT_EVENTS:
+        return None
+    entity = event.payload
+    for key in ("payload", "payment", "entity"):
+        # Any level may be missing or of the wrong type in a malformed event
+        entity = entity.get(key) if isinstance(entity, dict) else None
+    return entity if isinstance(entity, dict) else None
+
+
+def _insert_donations(rows):
+    """
+    Insert the rows of (event, row) pairs with one bulk_create. If one clashes with a row inserted
+    since they were checked, as a browser verification of a payment with no stored order can, they
+    are inserted one by one instead and the events of clashing rows are ignored. Returns the new rows.
+    """
+    try:
+        with db_transaction.atomic():
+            return Transaction.objects.bulk_create([row for _, row in rows])
+    except IntegrityError:
+        pass
+
+    inserted = []
+    for event, row in rows:
+        try:
+            with db_transaction.atomic():
+                row.save(force_insert=True)
+        except IntegrityError:
+            event.status, event.error = "ignored", "Payment already recorded"
+            continue
+        inserted.append(row)
+    return inserted
+
+
+def process_webhook_events(batch_size=500):
+    """
+    Turn up to batch_size pending inbox events into ledger rows.
+
+    The batch is handled in one DB transaction. Events are claimed with SKIP LOCKED so several
+    processors can run, and payment orders are locked like verify_payment locks them so a
+    browser verification of the same payment never races the webhook. The new donations are
+    inserted with one bulk_create, falling back to row by row inserts if one clashes. After the
+    commit they are anchored with one chain write for the whole batch; if that fails they stay
+    pending for the anchor_worker service (anchor_transactions).
+    Returns the number of events handled.
+    """
+    with db_transaction.atomic():
+        pending = WebhookEvent.objects.select_for_update(skip_locked=True).filter(status="pending")
+        events = list(pending.order_by("id")[:batch_size])
+        if not events:
+            return 0
+
+        payments = {}
+        for event in events:
+            entity = _payment_entity(event)
+            # The same payment shows up in both payment.captured and order.paid
+            if entity and entity.get("id") and entity["id"] not in payments:
+                payments[entity["id"]] = (event, entity)
+            else:
+                event.status = "ignored"
+
+        entities = [entity for _, entity in payments.values()]
+        orders = PaymentOrder.objects.select_for_update().filter(order_id__in={e.get("order_id") for e in entities})
+        orders = {order.order_id: order for order in orders}
+        recorded = set(
+            Transaction.objects.filter(razorpay_payment_id__in=payments).values_list("razorpay_payment_id", flat=True)
+        )
+
+        rows = []
+        for payment_id, (event, entity) in payments.items():
+            if payment_id in recorded:
+                event.status = "ignored"
+                continue
+            order = orders.get(entity.get("order_id"))
+            try:
+                if order:
+                    fields = order_donation_fields(order, payment_id, None)
+                else:
+                    fields = donation_fields(entity, payment_id, entity.get("order_id"), None)
+                fields["ngo_id"], fields["user_id"] = int(fields["ngo_id"]), int(fields["user_id"])
+            except (KeyError, TypeError, ValueError) as e:
+                event.status, event.error = "failed", f"Unusable payment entity: {e!r}"
+                continue
+            row = Transaction(**fields, status="pending")
+            row.leaf_hash = row.compute_leaf_hash()
+            rows.append((event, row))
+
+        # Notes of payments made outside this platform can point anywhere
+        ngo_ids = set(NGO.objects.filter(id__in={row.ngo_id for _, row in rows}).values_list("id", flat=True))
+        user_ids = set(User.objects.filter(id__in={row.user_id for _, row in rows}).values_list("id", flat=True))
+        known_rows = []
+        for event, row in rows:
+            if row.ngo_id in ngo_ids and row.user_id in user_ids:
+                event.status = "processed"
+                known_rows.append((event, row))
+            else:
+                event.status, event.error = "failed", "Unknown NGO or user in payment notes"
+
+        new_rows = _insert_donations(known_rows)
+        transactions_inserted(new_rows)
+
+        now = timezone.now()
+        for event in events:
+            event.processed_at = now
+        WebhookEvent.objects.bulk_update(events, ["status", "error", "processed_at"])
+
+    if new_rows:
+        anchor_pending_transactions(razorpay_payment_id__isnull=False)
+    return len(events)
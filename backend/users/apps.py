@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = "users"
+
+    def ready(self):
+        # Keep the authentication caches in step with token, user and NGO changes
+        from . import signals  # noqa: F401
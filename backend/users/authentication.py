@@ -0,0 +1,42 @@
+import copy
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import MISSING, token_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps valid tokens in the in-process token_cache, so repeat
+    requests with a token skip the token/user query. Deleted tokens and changed users are
+    dropped from the cache by the signal handlers in users.signals; other processes notice
+    within AUTH_TOKEN_CACHE_TTL seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is MISSING:
+            # Raises AuthenticationFailed for unknown keys and inactive users, which are not cached
+            _, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        # Each request gets its own user object, so nothing set on it leaks into other requests
+        return copy.copy(token.user), token
+
+
+async def authenticate_token(request):
+    """
+    Async counterpart of CachedTokenAuthentication for views that are not APIViews.
+    Returns the active user for an "Authorization: Token <key>" header, or None.
+    """
+    parts = request.headers.get("Authorization", "").split()
+    if len(parts) != 2 or parts[0].lower() != "token":
+        return None
+
+    token = token_cache.get(parts[1])
+    if token is MISSING:
+        token = await Token.objects.select_related("user").filter(key=parts[1]).afirst()
+        if token is None or not token.user.is_active:
+            return None
+        token_cache.set(parts[1], token)
+    return copy.copy(token.user)
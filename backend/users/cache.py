@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from ngos.models import NGO
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache holding at most maxsize entries, least recently used out first.
+    Entries also expire ttl seconds after they were stored; a ttl of 0 turns the cache off.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches predicate."""
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Token key -> Token with its user, for CachedTokenAuthentication
+token_cache = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+# User id -> the first NGO the user administers, or None
+ngo_admin_cache = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def admin_ngo(user):
+    """The NGO user administers (the first one if there are several), or None; cached per user."""
+    ngo = ngo_admin_cache.get(user.id)
+    if ngo is MISSING:
+        ngo = NGO.objects.filter(admin=user).first()
+        ngo_admin_cache.set(user.id, ngo)
+    return ngo
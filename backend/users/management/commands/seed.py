@@ -3,7 +3,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from ngos.models import NGO
-from ngos.utils import create_blockchain_record
+from transactions.ledger import record_transaction
 from transactions.models import Transaction
 from django.utils import timezone
 import random
@@ -160,15 +160,10 @@ class Command(BaseCommand):
                 "timestamp": timezone.now(),
             }
 
-            # Create a blockchain record for the transaction
-            blockchain_tx_hash = create_blockchain_record(
-                amount=transaction_data["amount"],
-                transaction_type=transaction_data["transaction_type"],
-                ngo_id=transaction_data["ngo"].id,
-            )
-
-            if blockchain_tx_hash:
-                self.stdout.write(f"Blockchain transaction hash: {blockchain_tx_hash}")
-                transaction_data["blockchain_hash"] = blockchain_tx_hash
-                transaction = Transaction.objects.create(**transaction_data)
+            # Create a blockchain record (or Merkle leaf) for the transaction
+            transaction = record_transaction(**transaction_data)
+
+            if transaction:
+                chain_hash = transaction.blockchain_hash or transaction.leaf_hash
+                self.stdout.write(f"Blockchain transaction hash: {chain_hash}")
                 self.stdout.write(f"Created transaction: {transaction.id} ({transaction.transaction_type})")
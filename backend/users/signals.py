@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from ngos.models import NGO
+from .cache import ngo_admin_cache, token_cache
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    token_cache.discard(instance.key)
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_user(sender, instance, **kwargs):
+    # A deactivated or renamed user must not keep authenticating as the cached copy
+    token_cache.discard_where(lambda token: token.user_id == instance.id)
+    ngo_admin_cache.discard(instance.id)
+
+
+@receiver([post_save, post_delete], sender=NGO)
+def forget_ngo_admin(sender, instance, **kwargs):
+    # The new admin, and whoever was cached as the admin before the change
+    ngo_admin_cache.discard(instance.admin_id)
+    ngo_admin_cache.discard_where(lambda ngo: ngo is not None and ngo.id == instance.id)
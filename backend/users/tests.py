@@ -1,3 +1,40 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from tests.fixtures import clear_caches, create_ngo
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.admin = User.objects.create_user(username="ngo_admin", password="password123")
+        self.token = Token.objects.create(user=self.admin)
+        self.ngo = create_ngo(self.admin)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_repeat_requests_skip_the_database(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse("ngo_admin")).data["id"], self.ngo.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("ngo_admin")).data["id"], self.ngo.id)
+
+    def test_changes_invalidate_the_cache(self):
+        self.client.get(reverse("ngo_admin"))
+
+        self.ngo.admin = User.objects.create_user(username="new_admin")
+        self.ngo.save()
+        self.assertEqual(self.client.get(reverse("ngo_admin")).status_code, 404)
+
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(self.client.get(reverse("ngo_admin")).status_code, 401)
+
+        self.admin.is_active = True
+        self.admin.save()
+        self.client.get(reverse("ngo_admin"))
+        self.token.delete()
+        self.assertEqual(self.client.get(reverse("ngo_admin")).status_code, 401)
@@ -3,7 +3,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from ngos.models import NGO
+from .cache import admin_ngo
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import AllowAny
 
@@ -32,12 +32,10 @@ class LoginUserView(APIView):
             token, _ = Token.objects.get_or_create(user=user)
 
             # Get NGO admin status
-            ngo = NGO.objects.filter(admin=user).first()
+            ngo = admin_ngo(user)
             is_ngo_admin = bool(ngo)
             ngo_id = ngo.id if ngo else None
 
-            print(f"Login response for {username}: isNGOAdmin={is_ngo_admin}, ngoId={ngo_id}")  # Debug log
-
             return Response(
                 {
                     "success": True,
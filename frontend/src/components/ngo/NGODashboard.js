@@ -54,6 +54,7 @@ function NGODashboard() {
   const [newImageUrl, setNewImageUrl] = useState("");
   const [uploading, setUploading] = useState(false);
   const [modalImage, setModalImage] = useState(null);
+  const [summary, setSummary] = useState(null);
 
   // Define fetchData function
   const fetchData = async () => {
@@ -62,11 +63,13 @@ function NGODashboard() {
       const ngoData = await api.ngos.getAdminNGO();
       setNgo(ngoData);
 
-      // Fetch both incoming and outgoing transactions
-      const [incoming, outgoing] = await Promise.all([
+      // Fetch both incoming and outgoing transactions, plus the running totals
+      const [incoming, outgoing, summaryData] = await Promise.all([
         api.transactions.getIncomingTransactions(ngoData.id),
         api.transactions.getOutgoingTransactions(ngoData.id),
+        api.ngos.getSummary(ngoData.id),
       ]);
+      setSummary(summaryData);
 
       setTransactions({
         donations: incoming,
@@ -87,16 +90,10 @@ function NGODashboard() {
     fetchData();
   }, []);
 
-  // Calculate totals
-  const totalDonations = transactions.donations.reduce(
-    (sum, tx) => sum + tx.amount,
-    0
-  );
-  const totalExpenses = transactions.expenses.reduce(
-    (sum, tx) => sum + tx.amount,
-    0
-  );
-  const balance = totalDonations - totalExpenses;
+  // Totals come from the ledger summary, the feeds only hold the latest page
+  const totalDonations = parseFloat(summary?.total_donated || 0);
+  const totalExpenses = parseFloat(summary?.total_spent || 0);
+  const balance = parseFloat(summary?.balance || 0);
 
   // Prepare chart data
   const getChartData = () => {
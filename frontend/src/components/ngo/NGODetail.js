@@ -10,6 +10,7 @@ import ImageModal from "../common/ImageModal";
 function NGODetail() {
   const { id } = useParams();
   const [ngo, setNgo] = useState(null);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [activeTab, setActiveTab] = useState("donations"); // 'donations' or 'expenses'
@@ -29,9 +30,13 @@ function NGODetail() {
   const fetchNGODetails = useCallback(async () => {
     try {
       setLoading(true);
-      const data = await api.ngos.getDetail(id);
+      const [data, summaryData] = await Promise.all([
+        api.ngos.getDetail(id),
+        api.ngos.getSummary(id),
+      ]);
       console.log("NGO Data received:", data);
       setNgo(data);
+      setSummary(summaryData);
       setError(null);
     } catch (err) {
       console.error("Error fetching NGO details:", err);
@@ -101,19 +106,13 @@ function NGODetail() {
           <div className="text-center">
             <p className="text-gray-600">Total Donations</p>
             <p className="text-2xl font-bold text-indigo-600">
-              $
-              {ngo?.donations
-                ?.reduce((sum, tx) => sum + parseFloat(tx.amount), 0)
-                .toFixed(2)}
+              ${parseFloat(summary?.total_donated || 0).toFixed(2)}
             </p>
           </div>
           <div className="text-center">
             <p className="text-gray-600">Total Expenses</p>
             <p className="text-2xl font-bold text-indigo-600">
-              $
-              {ngo?.expenses
-                ?.reduce((sum, tx) => sum + parseFloat(tx.amount), 0)
-                .toFixed(2)}
+              ${parseFloat(summary?.total_spent || 0).toFixed(2)}
             </p>
           </div>
         </div>
@@ -146,6 +146,16 @@ export const api = {
       }
     },
 
+    getSummary: async (ngoId) => {
+      const response = await fetch(`${API_BASE_URL}/ngos/${ngoId}/summary/`, {
+        ...getDefaultOptions(),
+      });
+      if (!response.ok) {
+        throw new Error("Failed to fetch NGO summary");
+      }
+      return response.json();
+    },
+
     donate: async (ngoId, amount) => {
       const response = await fetch(`${API_BASE_URL}/ngos/${ngoId}/donate/`, {
         method: "POST",